@@ -1,9 +1,77 @@
 from ..cluster import cluster
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
+
+class Evaluation_cache():
+    """Least recently used losses of (parameters, input) pairs, used by
+    master to skip redundant evaluations. Rows of a batch with identical
+    parameters are always evaluated once; losses are reused across batches
+    only if the loss is declared static (does not change over time).
+    Failed (inf) losses are not remembered."""
+    def __init__(self, size=10000, static=False):
+        self.size = size
+        self.static = static
+        self.losses = OrderedDict()
+        self.hits = 0    # rows not evaluated thanks to the cache
+        self.misses = 0  # rows evaluated
+
+    def key(self, prms, x=None):
+        return self.parameters_key(prms), self.input_key(x)
+
+    def parameters_key(self, prms):
+        return np.ascontiguousarray(prms, dtype=np.float64).tobytes()
+
+    def input_key(self, x):
+        return cluster.input_key(x)
+
+    def get(self, key):
+        loss = self.losses.get(key)
+        if loss is not None:
+            self.losses.move_to_end(key)
+        return loss
+
+    def put(self, key, loss):
+        self.losses[key] = loss
+        self.losses.move_to_end(key)
+        while len(self.losses) > self.size:
+            self.losses.popitem(last=False)
+
+    def clear(self):
+        self.losses.clear()
+
+    def split(self, p_array, x=None):
+        """Returns keys of the rows, their losses known from the cache (nan
+        if unknown) and indices of the rows that have to be evaluated"""
+        x_key = self.input_key(x)
+        keys = [(self.parameters_key(prms), x_key) for prms in p_array]
+        losses = np.full(len(keys), np.nan)
+        todo = {}
+        for i, key in enumerate(keys):
+            loss = self.get(key) if self.static else None
+            if loss is not None:
+                losses[i] = loss
+            elif key not in todo:
+                todo[key] = i
+        self.hits += len(keys) - len(todo)
+        self.misses += len(todo)
+        return keys, losses, list(todo.values())
+
+    def merge(self, keys, losses, todo, results):
+        """Completes losses of split by results of the evaluated rows"""
+        evaluated = {keys[i]: loss for i, loss in zip(todo, results)}
+        for key, loss in evaluated.items():
+            if loss != np.inf:
+                self.put(key, loss)
+        for i, key in enumerate(keys):
+            if key in evaluated:
+                losses[i] = evaluated[key]
+        return losses
 
 class Model_api():
 
+    vectorized = False  # forward evaluates (k, m) blocks of parameters
+
     def __init__(self):
 
         # this parameters information must be specified before super call
@@ -16,8 +84,14 @@ class Model_api():
         # evaluation counter
         self.evals = 0
 
+        # optional cache of losses on master (see set_cache)
+        self.cache = None
+
+        # cheaper configurations of forward (see set_fidelity_levels)
+        self.fidelity_levels = []
+
         # model state with res_file reference info
-        self.p = np.array(self.p_start)
+        self.p = np.array(self.p_start, dtype=np.float64)
         self.y = self.eval_loss(self.p)
 
         self.log = pd.DataFrame(columns=['Evaluations','Loss']) 
@@ -47,16 +121,75 @@ class Model_api():
         else:
             return y
 
+    def eval_objective(self, prms, x=None):
+        """Evaluates model and reduces its output to the scalar loss, so only
+        the scalar has to travel from the worker to master."""
+        return self.loss(self.eval_loss(prms, x))
+
+    def objectives(self, y):
+        """Vector of losses of the individual outputs (rows of y), loss is
+        their sum"""
+        y = np.asarray(y, dtype=np.float64)
+        if y.ndim == 0:
+            return y.reshape(1)
+        return y.reshape(len(y), -1).sum(axis=1)
+
+    def eval_objectives(self, prms, x=None):
+        """Evaluates model and reduces each of its outputs to a loss for
+        multi-objective optimizers, failed evaluation returns [inf]"""
+        return self.objectives(self.eval_loss(prms, x))
+
+    @cluster.vectorized
+    def eval_block_objective(self, block, x=None):
+        """Losses of a (k, m) block of parameter rows"""
+        return np.array([self.eval_objective(prms, x) for prms in block])
+
+    def eval_fidelity_objective(self, prms, level, x=None):
+        """eval_objective at fidelity level, len(fidelity_levels) is full"""
+        return self.eval_objective(prms, self.fidelity_input(x, int(level)))
+
+    def fidelity_input(self, x, level):
+        """Input x of forward modified to run at fidelity level"""
+        if level >= len(self.fidelity_levels):
+            return x
+        raise NotImplementedError(f"{self.__class__.__name__} has no fidelity levels")
+
+    def eval_batch_objective(self, prms, inputs):
+        """Sum of losses over a batch of inputs evaluated in one task"""
+        return sum(self.eval_objective(prms, x) for x in inputs)
+
     def update_state(self, p):
         "This function updates the current best state of the model"
         if cluster.global_rank == 0:
             self.p[:] = p
         #self.save_parameters()
-        data = (self.p, self.y)
-        self.p, self.y = cluster.broadcast(data)
+        cluster.Broadcast(self.p)
+        self.y = cluster.broadcast(self.y)
+
+    def set_cache(self, size=10000, static=False):
+        """Optimizers evaluate identical parameter vectors (e.g. clipped to
+        the same bounds) only once per batch. With static=True the loss is
+        declared independent of time, so losses of up to size recently
+        evaluated (parameters, input) pairs are reused, including the
+        re-evaluation of the current best. size=None disables the cache."""
+        if size is None:
+            self.cache = None
+        else:
+            self.cache = Evaluation_cache(size, static)
+
+    def set_fidelity_levels(self, levels):
+        """Cheaper configurations of forward for multi-fidelity optimization
+        (see Optimizer.set_multi_fidelity) as a list of dicts ordered from
+        the cheapest one, full fidelity is implicitly the last level.
+        Meaning of the settings is model specific. Must be set on all ranks."""
+        self.fidelity_levels = [dict(level) for level in levels]
 
     def get_total_evals(self):
         """Returns the number of calls to loss function performed on all nodes"""
+        if cluster.degraded():
+            # collective sum would wait for the busy ranks, counters
+            # reported by the workers with their results are used instead
+            return self.evals + cluster.reported_evals()
         return cluster.sum_all(self.evals)
 
     def update_log(self):
@@ -211,11 +211,11 @@ class open_modelica(Model_api):
         self.write_hash()
 
     # simulation related functions
-    def get_simulation_command_root(self):
+    def get_simulation_command_root(self, solver=None):
         """Construct the basic flags/options for the model executable"""
         flags = f" -inputPath={self.compile_dir}"
         flags += " -lv=-LOG_STATS,-stdout,-assert"
-        flags += f" -s={self.solver}"
+        flags += f" -s={self.solver if solver is None else solver}"
         flags += " -cpu"
         if self.abort_slow > 0:
             flags += f" -alarm={self.abort_slow}"
@@ -236,17 +236,21 @@ class open_modelica(Model_api):
         flag += self.prms_override_str.format(*prms)
         return flag
 
+    @cluster.traced("forward", "simulation")
     def forward(self, x=None, prms=None, output=None):
         """Build shell command with all flags and runs the executable"""
         gr = cluster.global_rank 
         tid = cluster.threading.get_ident()
         result_tag = f"gr{gr}tid{tid}"
-        command = self.get_simulation_command_root()
-        command += self.result_file_flag(result_tag)
         if prms is None:
             prms = self.p
         if x is None:
             x = self.input
+        solver = x.get("solver")  # fidelity levels may switch the solver
+        if solver is not None:
+            x = {key: value for key, value in x.items() if key != "solver"}
+        command = self.get_simulation_command_root(solver)
+        command += self.result_file_flag(result_tag)
         command += self.override_flag(x, prms)
         retcode = call(command, shell=True, stdout=PIPE, stderr=PIPE)
         if retcode != 0:
@@ -259,6 +263,14 @@ class open_modelica(Model_api):
             return None
         return y
 
+    def fidelity_input(self, x, level):
+        """Simulation settings of the level (e.g. stepSize, tolerance,
+        stopTime, solver) override the ones of input x"""
+        if level >= len(self.fidelity_levels):
+            return x
+        x = self.input if x is None else x
+        return {**x, **self.fidelity_levels[level]}
+
     @cluster.on_master
     def get_formatted_parameters(self):
         """Returns string of best known parameters in OM override_file format"""
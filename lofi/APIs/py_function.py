@@ -3,10 +3,13 @@ import  numpy as np
 from .model_api import Model_api
 
 class py_function(Model_api):
-    def __init__(self, f, p_start, p_lb, p_ub): 
+    def __init__(self, f, p_start, p_lb, p_ub, vectorized=False):
         self.f = f
         self.model = f.__name__
 
+        # f(x, block) takes (k, m) block of parameter rows, returns k outputs
+        self.vectorized = vectorized
+
         self.p_start = p_start
         self.p_lb = np.array(p_lb)
         self.p_ub = np.array(p_ub)
@@ -19,8 +22,20 @@ class py_function(Model_api):
     def forward(self, x=None, prms=None, output=None):
         """Evaluate function with imput x and parameters prms"""
         # add result checks to avoid singularities and such
+        if self.vectorized:
+            return np.asarray(self.f(x, np.asarray(prms)[None, :]))[0]
         return self.f(x, prms)
 
+    @cluster.vectorized
+    def eval_block_objective(self, block, x=None):
+        """Losses of a (k, m) block of parameter rows, by a single call of f
+        if it is vectorized"""
+        if not self.vectorized:
+            return super().eval_block_objective(block, x)
+        self.evals += len(block)
+        y = np.asarray(self.f(x, block), dtype=np.float64).reshape(len(block), -1)
+        return y.sum(axis=1)  # loss of every row
+
     @cluster.on_master 
     def print_parameters(self):
         print(self.p)
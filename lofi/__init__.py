@@ -3,6 +3,7 @@ from . import APIs
 from . import optimizers
 from . import visualizers
 from . import initializers
+from . import surrogates
 from time import sleep
 
 # lofi has interactive mode that can be call using lofi.imode(globals())
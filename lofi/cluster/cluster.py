@@ -1,24 +1,119 @@
-from mpi4py import MPI
 import threading
 import sys
 import time
-from collections import Mapping, Container
+import os
+import platform
+import concurrent.futures
+import functools
+import pickle
+import json
+from collections import deque
+from collections.abc import Mapping, Container
 import numpy as np
 import itertools
+import bisect
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
 
-comm = MPI.COMM_WORLD
+class Serial_request():
+    def test(self):
+        return True, None
+
+    def wait(self):
+        pass
+
+class Serial_comm():
+    """Single rank stand-in for MPI.COMM_WORLD used when mpi4py is not
+    installed. Implements the collective calls only, maps are then evaluated
+    on this process by options.backend."""
+    def Get_size(self):
+        return 1
+
+    def Get_rank(self):
+        return 0
+
+    def allgather(self, object):
+        return [object]
+
+    def gather(self, object, root=0):
+        return [object]
+
+    def scatter(self, objects, root=0):
+        return objects[0]
+
+    def bcast(self, object, root=0):
+        return object
+
+    def Bcast(self, buffer, root=0):
+        pass
+
+    def reduce(self, object, op=None, root=0):
+        return object
+
+    def allreduce(self, object, op=None):
+        return object
+
+    def barrier(self):
+        pass
+
+    def Barrier(self):
+        pass
+
+    def Ibarrier(self):
+        return Serial_request()
+
+    def Split(self, color=0, key=0):
+        return self
+
+if MPI is not None:
+    comm = MPI.COMM_WORLD
+    status = MPI.Status()
+    name = MPI.Get_processor_name()
+else:
+    comm = Serial_comm()
+    status = None
+    name = platform.node()
 size = comm.Get_size()
-status = MPI.Status()
 global_rank = comm.Get_rank()
-name = MPI.Get_processor_name()
 namelist = comm.allgather(name)
 nodelist = list(set(namelist))
 local_rank = len([i for i in namelist[:global_rank] if i == name])
+node_comm = comm.Split(color=sorted(nodelist).index(name), key=global_rank)
+node_size = node_comm.Get_size()
+
+# machine masters (local_rank 0) share leader_comm, e.g. for island models
+leader_comm = comm.Split(color=0 if local_rank == 0 else 1, key=global_rank)
+
+def input_key(x):
+    """Hashable exact representation of input x (repr of numpy rounds and
+    abbreviates, so different inputs could share it)"""
+    if isinstance(x, np.ndarray) and x.dtype != object:
+        return x.dtype.str, x.shape, np.ascontiguousarray(x).tobytes()
+    return pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)
 
 class Options():
     def __init__(self):
         self.reports_active = False
         self.interactive = False
+        self.chunk_mode = None   # None, 'fixed', 'guided' or 'adaptive'
+        self.chunk_size = 1      # (minimal) number of work items per message
+        self.chunk_time = 0.05   # seconds of work per message in adaptive mode
+        self.hierarchical = False  # schedule other nodes through node masters
+        self.backend = "mpi"     # 'mpi', 'process' or 'thread'
+        self.backend_workers = None  # size of process/thread pool
+        self.straggler_factor = None  # deadline in multiples of expected time
+        self.speculative = True       # duplicate late tasks to idle workers
+        self.abandon_factor = None    # give up late tasks (inf) after this
+        self.straggler_samples = 5    # results needed before deadlines apply
+        self.poll_interval = 0.001    # master sleep while polling for results
+        self.cost_ordering = False    # longest expected inputs go out first
+        self.catch_exceptions = True  # failing work items give inf results
+        self.task_timeout = None      # seconds before a rank is unresponsive
+        self.timeout_factor = None    # same in multiples of expected time
+        self.instrumentation = False  # count traffic and time (see stats)
+        self.tracing = False          # record spans of execution (see tracer)
 
     def activate_reports(self):
         """Activate progress reports of cluster execution."""
@@ -47,8 +142,119 @@ class Options():
     def activate_interactive_mode(self):
         self.interactive = True
 
+    def set_chunking(self, mode="guided", size=1, target_time=0.05):
+        """Ship work items to workers in chunks instead of one by one.
+        fixed    -> every message carries size items
+        guided   -> chunks shrink with the remaining work (never below size)
+        adaptive -> chunks carry about target_time seconds of work estimated
+                    from elapsed times measured so far (never below size)
+        mode=None restores one item per message."""
+        if mode not in (None, "fixed", "guided", "adaptive"):
+            raise ValueError(f"Unknown chunking mode: {mode}")
+        self.chunk_mode = mode
+        self.chunk_size = max(1, int(size))
+        self.chunk_time = target_time
+
+    def set_hierarchical(self, active=True):
+        """Global master sends blocks of work to one node master per remote
+        machine (local_rank 0), which schedules them over its node workers
+        and returns the results of the whole block in one message.
+        Must be set the same way on all ranks. Works best with chunking
+        (e.g. set_chunking("guided")) so the blocks are large."""
+        self.hierarchical = active
+
+    def set_straggler_policy(self, factor=5.0, speculative=True,
+                             abandon_factor=None, min_samples=5):
+        """Deadline of a task in flight is factor times its expected time
+        (median round trip per item of the current map, from dispatch to
+        the arrival of results, times chunk length).
+        Late tasks are duplicated to idle workers once the queue is empty
+        (speculative) and the first result wins. Tasks older than
+        abandon_factor times the expected time get inf results, so the map
+        can finish without them. factor=None disables straggler handling."""
+        self.straggler_factor = factor
+        self.speculative = speculative
+        self.abandon_factor = abandon_factor
+        self.straggler_samples = min_samples
+
+    def set_fault_tolerance(self, timeout=3600.0, factor=None,
+                            catch_exceptions=True):
+        """A rank whose task is older than timeout seconds (and factor times
+        its expected time, if given) is considered unresponsive, its task is
+        reassigned to a healthy worker and the rank gets no more work until
+        it answers again. Exceptions raised by work are reported as failed
+        (inf) results unless catch_exceptions is False. timeout=None disables
+        the liveness check. Must be set the same way on all ranks."""
+        self.task_timeout = timeout
+        self.timeout_factor = factor
+        self.catch_exceptions = catch_exceptions
+
+    def set_instrumentation(self, active=True):
+        """Counts messages and bytes sent/received, time spent waiting for
+        messages and evaluating work on every rank (see stats and
+        gather_stats). Serialized sizes of pickled messages are measured by
+        pickling them once more, so keep it off for production runs.
+        Must be set the same way on all ranks."""
+        self.instrumentation = active
+        stats.reset()
+
+    def set_tracing(self, active=True, capacity=100000):
+        """Records timestamped spans (waiting for messages, evaluations,
+        optimizer phases, ...) of every rank into a ring buffer keeping the
+        last capacity spans, see write_trace. Must be set the same way on
+        all ranks."""
+        self.tracing = active
+        tracer.resize(capacity)
+
+    def set_cost_ordering(self, active=True, key=input_key, smoothing=0.3):
+        """Product maps dispatch inputs with the longest expected evaluation
+        time first (LPT), so the end of each map is filled with short tasks.
+        Expected times are exponential moving averages (with given smoothing)
+        of elapsed times measured for inputs of the same key(x)."""
+        self.cost_ordering = active
+        cost_model.key = key
+        cost_model.smoothing = smoothing
+
+    def set_backend(self, backend="mpi", workers=None):
+        """Executes maps of master without MPI.
+        mpi     -> ranks started by mpirun (a single rank evaluates serially)
+        process -> concurrent.futures.ProcessPoolExecutor, suits python
+                   functions (py_function)
+        thread  -> concurrent.futures.ThreadPoolExecutor, suits models that
+                   release the GIL such as open_modelica subprocess calls
+        workers defaults to os.cpu_count()."""
+        if backend not in ("mpi", "process", "thread"):
+            raise ValueError(f"Unknown backend: {backend}")
+        shutdown_executor()
+        self.backend = backend
+        self.backend_workers = workers
+
 options = Options()
 
+class Cost_model():
+    """Expected evaluation time of inputs learnt from measured elapsed times"""
+    def __init__(self, key=input_key, smoothing=0.3):
+        self.key = key
+        self.smoothing = smoothing
+        self.costs = {}
+
+    def update(self, key, elapsed):
+        if key in self.costs:
+            self.costs[key] += self.smoothing*(elapsed - self.costs[key])
+        else:
+            self.costs[key] = elapsed
+
+    def predict(self, keys):
+        """Expected times of keys, unknown keys get the mean of known ones"""
+        default = np.mean(list(self.costs.values())) if self.costs else 0.0
+        return np.array([self.costs.get(key, default) for key in keys])
+
+    def order(self, keys):
+        """Indices of keys sorted by decreasing expected time"""
+        return np.argsort(-self.predict(keys), kind='stable')
+
+cost_model = Cost_model()
+
 class Timer():
     def __init__(self):
         self.start_time = time.time()
@@ -62,28 +268,297 @@ class Timer():
         t = time.time()
         lap = t - self.last_lap
         self.last_lap = t
-        return time.time() - self.last_lap
+        return lap
+
+class Traffic_stats():
+    """Instrumentation counters of this rank since the last reset.
+    wait_time    -> seconds blocked waiting for messages (or futures)
+    compute_time -> seconds spent evaluating work items
+    result_bytes -> memory taken by results of the last map (master)"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.wait_time = 0.0
+        self.compute_time = 0.0
+        self.items = 0
+        self.result_bytes = 0
+        self.timer = Timer()
+
+    def sent(self, nbytes, messages=1):
+        self.messages_sent += messages
+        self.bytes_sent += nbytes
+
+    def received(self, nbytes, messages=1):
+        self.messages_received += messages
+        self.bytes_received += nbytes
+
+    def as_dict(self):
+        return {"rank": global_rank,
+                "name": name,
+                "wall_time": self.timer.get_elapsed(),
+                "messages_sent": self.messages_sent,
+                "bytes_sent": self.bytes_sent,
+                "messages_received": self.messages_received,
+                "bytes_received": self.bytes_received,
+                "wait_time": self.wait_time,
+                "compute_time": self.compute_time,
+                "items": self.items,
+                "result_bytes": self.result_bytes}
+
+stats = Traffic_stats()
+
+def pickled_size(object):
+    return len(pickle.dumps(object, pickle.HIGHEST_PROTOCOL))
+
+class Cluster_stats():
+    """Instrumentation of all ranks gathered by gather_stats.
+    ranks is a list of Traffic_stats.as_dict() ordered by rank, totals sums
+    the counters over all ranks. utilization is the fraction of wall time
+    every rank spent evaluating work, master_wait is the fraction of wall
+    time master spent blocked on workers."""
+    counters = ("messages_sent", "bytes_sent", "messages_received",
+                "bytes_received", "wait_time", "compute_time", "items")
+
+    def __init__(self, ranks):
+        self.ranks = ranks
+        self.wall_time = ranks[0]["wall_time"]
+        self.totals = {key: sum(r[key] for r in ranks) for key in self.counters}
+        self.utilization = np.array([r["compute_time"]/r["wall_time"]
+                                     if r["wall_time"] > 0 else 0.0
+                                     for r in ranks])
+        self.master_wait = ranks[0]["wait_time"]/self.wall_time \
+            if self.wall_time > 0 else 0.0
+        self.result_bytes = ranks[0]["result_bytes"]
+
+    def worker_utilization(self):
+        """Mean utilization of ranks evaluating work (master too if alone)"""
+        if len(self.ranks) == 1:
+            return self.utilization[0]
+        return self.utilization[1:].mean()
+
+    def bound(self):
+        """'simulation' if workers are kept busy, 'communication' if they
+        idle while master is not waiting for them (it is busy shipping data)"""
+        if self.worker_utilization() >= 0.5 or self.master_wait >= 0.5:
+            return "simulation"
+        return "communication"
+
+    def __repr__(self):
+        t = self.totals
+        return (f"Cluster_stats(wall_time={self.wall_time:.4f}, "
+                f"messages={t['messages_sent']}, bytes={t['bytes_sent']}, "
+                f"master_wait={self.master_wait:.3f}, "
+                f"worker_utilization={self.worker_utilization():.3f}, "
+                f"bound='{self.bound()}')")
+
+def gather_stats(reset=True):
+    """Collects stats of all ranks (collective call), returns Cluster_stats
+    on master and None elsewhere. Counters restart if reset is True."""
+    ranks = comm.gather(stats.as_dict(), root=0)
+    if reset:
+        stats.reset()
+    if global_rank == 0:
+        return Cluster_stats(ranks)
+
+class Tracer():
+    """Ring buffer of (name, category, start, end) spans of this rank,
+    times are seconds since epoch (time.time())."""
+    def __init__(self, capacity=100000):
+        self.events = deque(maxlen=capacity)
+
+    def resize(self, capacity):
+        self.events = deque(self.events, maxlen=capacity)
+
+    def add(self, name, category, start, end):
+        self.events.append((name, category, start, end))
+
+    def extend(self, name, category, start, end, gap):
+        """Like add but prolongs the last span if it is the same and ended
+        less than gap seconds before start (e.g. polling loops)"""
+        if self.events:
+            last = self.events[-1]
+            if last[0] == name and last[1] == category and start - last[3] < gap:
+                self.events[-1] = (name, category, last[2], end)
+                return
+        self.events.append((name, category, start, end))
+
+    def clear(self):
+        self.events.clear()
+
+tracer = Tracer()
+
+class Span():
+    """Context manager recording the enclosed block as a span if tracing"""
+    __slots__ = ('name', 'category', 'start')
+    def __init__(self, name, category="lofi"):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if options.tracing:
+            tracer.add(self.name, self.category, self.start, time.time())
+        return False
+
+def traced(name=None, category="lofi"):
+    """Decorator recording every call of the function as a span if tracing"""
+    def decorator(f):
+        label = f.__name__ if name is None else name
+        @functools.wraps(f)
+        def decorated_f(*args, **kwargs):
+            if not options.tracing:
+                return f(*args, **kwargs)
+            start = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                tracer.add(label, category, start, time.time())
+        return decorated_f
+    return decorator
+
+def gather_trace(clear=True):
+    """Collects spans of all ranks (collective call). Returns list of
+    (rank, name, category, start, end) on master, None elsewhere. Clocks of
+    other machines are aligned to master at a barrier (roughly, to the
+    latency of the barrier)."""
+    comm.Barrier()
+    now = time.time()
+    gathered = comm.gather((now, list(tracer.events)), root=0)
+    if clear:
+        tracer.clear()
+    if global_rank != 0:
+        return None
+    events = []
+    for rank, (clock, rank_events) in enumerate(gathered):
+        offset = clock - now
+        for span_name, category, start, end in rank_events:
+            events.append((rank, span_name, category, start - offset, end - offset))
+    return events
+
+def write_trace(filename="lofi_trace.json", clear=True):
+    """Gathers spans of all ranks (collective call) and master writes them
+    in Chrome trace format (loads in Perfetto or chrome://tracing). Every
+    machine is a process and every rank a thread of the timeline."""
+    events = gather_trace(clear)
+    if global_rank != 0:
+        return
+    origin = min((event[3] for event in events), default=0.0)
+    nodes = sorted(nodelist)
+    trace = []
+    for node in nodes:
+        trace.append({"name": "process_name", "ph": "M", "pid": nodes.index(node),
+                      "args": {"name": node}})
+    for rank, node in enumerate(namelist):
+        role = "master" if rank == 0 else "worker"
+        trace.append({"name": "thread_name", "ph": "M", "pid": nodes.index(node),
+                      "tid": rank, "args": {"name": f"rank {rank} ({role})"}})
+    for rank, span_name, category, start, end in events:
+        trace.append({"name": span_name, "cat": category, "ph": "X",
+                      "pid": nodes.index(namelist[rank]), "tid": rank,
+                      "ts": (start - origin)*1e6, "dur": (end - start)*1e6})
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+def vectorized(f):
+    """Marks work functions taking a (k, m) block of parameter rows as
+    first argument (other arguments shared by the block) and returning k
+    results. Maps then ship the rows in blocks and workers evaluate every
+    block by a single call."""
+    f.vectorized = True
+    return f
+
+def is_vectorized(work):
+    return getattr(work, 'vectorized', False)
 
 def on_master(f):
+    @functools.wraps(f)
     def decorated_f(*args, **kwargs):
         if global_rank == 0:
             return f(*args, **kwargs)
     return decorated_f
 
 def on_machine(f):
+    @functools.wraps(f)
     def decorated_f(*args, **kwargs):
         if local_rank == 0:
             return f(*args, **kwargs)
     return decorated_f
 
-class Sequential_queue():
-    def __init__(self, args, kwargs):
+class Queue():
+    """Bookkeeping shared by all map queues. Subclasses implement
+    get_item(flat_index) and store(index, result, elapsed)."""
+    def __init__(self):
+        self.index = 0
+        self.received = 0
+        self.elapsed_sum = 0.0
+        self.order = None  # optional dispatch order of flat indices
+        self.vectorized = False  # work evaluates blocks of rows at once
+
+    def next_items(self, n=None):
+        start = self.index
+        if n is None:
+            end = self.data_count
+        else:
+            end = min(self.index + n, self.data_count)
+
+        for i in range(start, end):
+            if self.order is None:
+                yield self.get_item(self.index)
+            else:
+                yield self.get_item(self.order[self.index])
+            self.index += 1
+
+    def chunk_length(self, workers):
+        """Number of items for the next message according to options."""
+        mode = options.chunk_mode
+        remaining = self.data_count - self.index
+        guided = -(-remaining // (2*workers))  # ceil division
+        if mode is None:
+            # vectorized work gets blocks of rows even without chunking
+            return guided if self.vectorized else 1
+        elif mode == "fixed":
+            return options.chunk_size
+        if mode == "guided" or self.received == 0:
+            return max(options.chunk_size, guided)
+        mean_elapsed = self.elapsed_sum/self.received
+        if mean_elapsed > 0.0:
+            adaptive = int(options.chunk_time/mean_elapsed)
+        else:
+            adaptive = guided
+        return max(options.chunk_size, min(adaptive, guided))
+
+    def next_chunk(self, workers=1, weight=1):
+        """List of (args, kwargs, index) items to be shipped in one message,
+        weight is the number of workers served through the destination"""
+        return list(self.next_items(n=weight*self.chunk_length(workers)))
+
+    def empty_results(self):
+        while self.received != self.data_count:
+            yield True
 
+    def __len__(self):
+        return self.data_count
+
+    def put_result(self, result_data):
+        result, elapsed, index = result_data
+        self.store(index, result, elapsed)
+        self.elapsed_sum += elapsed
+        self.received += 1
+
+class Sequential_queue(Queue):
+    def __init__(self, args, kwargs):
+        super().__init__()
         self.args = args
         self.kwargs = kwargs
         self.set_data_count()
-        self.index = 0
-        self.received = 0
         self.results = [None]*self.data_count
         self.elapsed = [None]*self.data_count
 
@@ -114,146 +589,996 @@ class Sequential_queue():
     def get_kwargs(self, index):
         return {key: self.get(value, index) for key, value in self.kwargs.items()}
 
+    def get_item(self, index):
+        return self.get_args(index), self.get_kwargs(index), index
+
+    def store(self, index, result, elapsed):
+        self.results[index] = result
+        self.elapsed[index] = elapsed
+
+class Product_queue(Queue):
+    """Queue over the cartesian product of any number of axes (e.g.
+    candidates x inputs x seeds). Items are generated lazily from the flat
+    index, numeric results and elapsed times are kept in NumPy arrays
+    (results fall back to an object array for other data). With a binary
+    ufunc reduce (having identity, e.g. np.add) results are accumulated over
+    the axes in reduce_axes as they stream in."""
+    def __init__(self, axes, reduce=None, reduce_axes=()):
+        super().__init__()
+        # items of the other axes are the same objects in every work item,
+        # so vectorized work can stack the rows sharing them
+        self.axes = [axes[0]] + [list(axis) for axis in axes[1:]]
+        self.shape = tuple(len(axis) for axis in axes)
+        self.data_count = int(np.prod(self.shape))
+        self.reduce = reduce
+        if isinstance(reduce_axes, int):
+            reduce_axes = (reduce_axes,)
+        self.kept_axes = [k for k in range(len(axes)) if k not in reduce_axes]
+        if reduce is None:
+            self.results = np.full(self.shape, np.nan)
+        else:
+            kept_shape = tuple(self.shape[k] for k in self.kept_axes)
+            self.results = np.full(kept_shape, reduce.identity, dtype=np.float64)
+        self.elapsed = np.full(self.shape, np.nan)
+
+        # all candidates (axis 0) of the most expensive inputs first (LPT)
+        self.input_keys = None
+        if options.cost_ordering and len(axes) > 1:
+            keys = [[cost_model.key(x) for x in axis] for axis in axes[1:]]
+            if len(keys) == 1:
+                self.input_keys = keys[0]
+            else:
+                self.input_keys = list(itertools.product(*keys))
+            inputs = cost_model.order(self.input_keys)
+            inner = len(self.input_keys)
+            candidates = np.arange(self.shape[0])
+            self.order = (candidates[None, :]*inner + inputs[:, None]).ravel()
+
     def next_items(self, n=None):
-        start = self.index
-        if n is None:
-            end = self.data_count
+        if self.order is None and self.vectorized and len(self.shape) > 1:
+            # all candidates (axis 0) of an input go out together
+            self.order = np.arange(self.data_count).reshape(
+                self.shape[0], -1).T.ravel()
+        return super().next_items(n)
+
+    def flat_index_to_index(self, flat_index):
+        index = []
+        for length in reversed(self.shape):
+            flat_index, i = divmod(int(flat_index), length)
+            index.append(i)
+        return tuple(reversed(index))
+
+    def get_item(self, flat_index):
+        index = self.flat_index_to_index(flat_index)
+        return tuple(axis[i] for axis, i in zip(self.axes, index)), {}, index
+
+    def store(self, index, result, elapsed):
+        if self.reduce is not None:
+            kept = tuple(index[k] for k in self.kept_axes)
+            self.results[kept] = self.reduce(self.results[kept], result)
         else:
-            end = min(self.index + n, self.data_count)
+            if not is_number(result) and self.results.dtype != object:
+                self.results = self.results.astype(object)
+            self.results[index] = result
+        self.elapsed[index] = elapsed
+        if self.input_keys is not None:
+            inner = len(self.input_keys)
+            flat_index = np.ravel_multi_index(index, self.shape)
+            cost_model.update(self.input_keys[flat_index % inner], elapsed)
 
-        for i in range(start, end):
-            yield self.get_args(self.index), self.get_kwargs(self.index), self.index
+class Async_queue(Queue):
+    """Queue of steady-state optimization. source() returns (key, args,
+    kwargs) of a new task, or None when nothing can be generated right now,
+    and is asked whenever a worker becomes free, so new tasks reflect every
+    result received so far. sink(key, result, elapsed) consumes the results
+    in order of arrival. The queue ends after count results."""
+    def __init__(self, source, sink, count):
+        super().__init__()
+        self.source = source
+        self.sink = sink
+        self.data_count = count
+        self.results = None
+        self.elapsed = []
+
+    def next_items(self, n=None):
+        if n is None:
+            n = self.data_count - self.index
+        for i in range(n):
+            if self.index >= self.data_count:
+                break
+            item = self.source()
+            if item is None:
+                break
+            key, args, kwargs = item
             self.index += 1
+            yield args, kwargs, key
 
-    def empty_results(self):
-        while self.received != self.data_count:
-            yield True
+    def store(self, key, result, elapsed):
+        self.elapsed.append(elapsed)
+        self.sink(key, result, elapsed)
 
-    def __len__(self):
-        return self.data_count
+class Chunk_queue(Queue):
+    """Queue over items of a chunk received by node master"""
+    def __init__(self, chunk):
+        super().__init__()
+        self.chunk = chunk
+        self.data_count = len(chunk)
+        self.results = [None]*self.data_count
+        self.elapsed = [None]*self.data_count
 
-    def put_result(self, result_data):
-        result, elapsed, index = result_data
+    def get_item(self, index):
+        args, kwargs = self.chunk[index]
+        return args, kwargs, index
+
+    def store(self, index, result, elapsed):
         self.results[index] = result
         self.elapsed[index] = elapsed
-        self.received += 1
 
-#TODO: change for nd not just 2d
-class _2D_Product_queue():
-    def __init__(self, args):
+class Worker_killer():
+    def __init__(self):
+        pass
+worker_killer = Worker_killer()
+
+# message tags of the point to point transport
+TAG_OBJECT = 0  # pickled python object
+TAG_HEADER = 1  # pickled chunk skeleton announcing a float64 row block
+TAG_BUFFER = 2  # contiguous float64 buffer (row block or results)
+TAG_ROWS = 3    # [fid, n, m, n*m row values] chunk where rows are the only args
+
+class Row_ref():
+    """Placeholder of an argument that travels inside the row block."""
+    __slots__ = ('row',)
+    def __init__(self, row):
+        self.row = row
+
+    def __getstate__(self):
+        return self.row
+
+    def __setstate__(self, row):
+        self.row = row
+
+class Buffer():
+    """Preallocated float64 buffer that grows when necessary."""
+    def __init__(self):
+        self.data = np.empty(0)
+
+    def get(self, n):
+        if self.data.size < n:
+            self.data = np.empty(max(n, 2*self.data.size))
+        return self.data[:n]
+
+chunk_buffer = Buffer()   # rows received by workers
+send_buffer = Buffer()    # rows sent by master
+result_buffer = Buffer()  # results received by master
+chunk_status = MPI.Status() if MPI is not None else None
+
+def is_row(arg):
+    return type(arg) is np.ndarray and arg.dtype == np.float64 and arg.ndim == 1
+
+def is_number(result):
+    return isinstance(result, (float, int, np.floating, np.integer)) \
+        and not isinstance(result, bool)
+
+@traced("send_chunk", "cluster")
+def send_chunk(chunk, dest, fid=0, comm=comm):
+    """Sends list of (args, kwargs) for work function fid to dest.
+    Float64 vectors found among the positional arguments are stacked into
+    one contiguous block and sent as a buffer, everything else (if anything)
+    is pickled with the skeleton."""
+    rows = [args[0] for args, kwargs in chunk
+            if len(args) == 1 and not kwargs and is_row(args[0])]
+    if rows and len(rows) == len(chunk) \
+            and all(row.size == rows[0].size for row in rows):
+        # rows are the only arguments -> single message without pickling
+        n, m = len(rows), rows[0].size
+        buffer = send_buffer.get(3 + n*m)
+        buffer[:3] = fid, n, m
+        np.stack(rows, out=buffer[3:].reshape(n, m))
+        comm.Send(buffer, dest=dest, tag=TAG_ROWS)
+        if options.instrumentation:
+            stats.sent(buffer.nbytes)
+        return
+
+    rows = []
+    refs = {}  # id of a row -> its Row_ref, rows shared by items travel once
+    skeleton = []
+    for args, kwargs in chunk:
+        packed = []
+        for arg in args:
+            if is_row(arg) and (not rows or arg.size == rows[0].size):
+                if id(arg) not in refs:
+                    refs[id(arg)] = Row_ref(len(rows))
+                    rows.append(arg)
+                packed.append(refs[id(arg)])
+            else:
+                packed.append(arg)
+        skeleton.append((tuple(packed), kwargs))
+    if rows:
+        block = np.stack(rows)
+        header = (fid, skeleton, block.shape)
+        comm.send(header, dest=dest, tag=TAG_HEADER)
+        comm.Send(block, dest=dest, tag=TAG_BUFFER)
+        if options.instrumentation:
+            stats.sent(pickled_size(header) + block.nbytes, 2)
+    else:
+        comm.send((fid, chunk), dest=dest, tag=TAG_OBJECT)
+        if options.instrumentation:
+            stats.sent(pickled_size((fid, chunk)))
+
+def receive_chunk(source=0, comm=comm):
+    """Counterpart of send_chunk returning (fid, chunk), or a control object
+    (Worker_killer, Pool_call) sent by master. Rows are received into
+    preallocated chunk_buffer, so they are valid only until the next chunk
+    arrives."""
+    with Span("wait", "cluster") as span:
+        comm.Probe(source=source, tag=MPI.ANY_TAG, status=chunk_status)
+    if options.instrumentation:
+        stats.wait_time += time.time() - span.start
+        stats.received(chunk_status.Get_count(MPI.BYTE))
+    tag = chunk_status.Get_tag()
+    if tag == TAG_OBJECT:
+        return comm.recv(None, source=source, tag=TAG_OBJECT)
+    elif tag == TAG_ROWS:
+        buffer = chunk_buffer.get(chunk_status.Get_count(MPI.DOUBLE))
+        comm.Recv(buffer, source=source, tag=TAG_ROWS)
+        fid, n, m = int(buffer[0]), int(buffer[1]), int(buffer[2])
+        return fid, [((row,), {}) for row in buffer[3:].reshape(n, m)]
+    fid, skeleton, shape = comm.recv(None, source=source, tag=TAG_HEADER)
+    block = chunk_buffer.get(shape[0]*shape[1]).reshape(shape)
+    comm.Recv(block, source=source, tag=TAG_BUFFER)
+    if options.instrumentation:
+        stats.received(block.nbytes)
+    chunk = []
+    views = {}  # items sharing a row share its view too
+    for args, kwargs in skeleton:
+        args = tuple(views.setdefault(a.row, block[a.row]) if type(a) is Row_ref
+                     else a for a in args)
+        chunk.append((args, kwargs))
+    return fid, chunk
+
+def send_results(results, dest=0, comm=comm, evals=None):
+    """Sends list of (result, elapsed) pairs and the evaluation counter of
+    the sender (None if unknown). Numeric results travel as a float64 buffer
+    [result_0, elapsed_0, result_1, ..., evals, 0], anything else is pickled."""
+    if all(is_number(result) for result, elapsed in results):
+        buffer = np.array(results + [(np.nan if evals is None else evals, 0.0)],
+                          dtype=np.float64)
+        comm.Send(buffer, dest=dest, tag=TAG_BUFFER)
+        if options.instrumentation:
+            stats.sent(buffer.nbytes)
+    else:
+        comm.send((results, evals), dest=dest, tag=TAG_OBJECT)
+        if options.instrumentation:
+            stats.sent(pickled_size((results, evals)))
+
+def receive_results(status=status, comm=comm):
+    """Receives (result, elapsed) pairs and the evaluation counter from any
+    worker. Rank of the worker is available in status after the call."""
+    with Span("wait", "cluster") as span:
+        comm.Probe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status)
+    if options.instrumentation:
+        stats.wait_time += time.time() - span.start
+        stats.received(status.Get_count(MPI.BYTE))
+    source = status.Get_source()
+    if status.Get_tag() == TAG_OBJECT:
+        return comm.recv(None, source=source, tag=TAG_OBJECT)
+    buffer = result_buffer.get(status.Get_count(MPI.DOUBLE))
+    comm.Recv(buffer, source=source, tag=TAG_BUFFER)
+    evals = buffer[-2]
+    return buffer[:-2].reshape(-1, 2).tolist(), \
+        None if np.isnan(evals) else int(evals)
+
+class Pool_call():
+    """Instruction for resident workers to call a registered function."""
+    def __init__(self, fid, args, kwargs):
+        self.fid = fid
         self.args = args
-        self.shape = (len(args[0]), len(args[1]))
-        self.data_count = self.shape[0]*self.shape[1]
-        self.flat_index = 0
-        self.received = 0
-        self.results = [[None]*self.shape[1] for i in range(self.shape[0])]
-        self.elapsed = [[None]*self.shape[1] for i in range(self.shape[0])]
+        self.kwargs = kwargs
 
-    def flat_index_to_2D_index(self, flat_index):
-        index_0 = int(flat_index/self.shape[1])
-        index_1 = flat_index % self.shape[1]
-        return (index_0, index_1)
+class Worker_pool():
+    """Keeps workers resident across any number of maps.
+    Work functions are registered on every rank in the same order (SPMD),
+    so only their integer ids travel with the chunks. On master,
+    start() returns True and the maps (and everywhere calls) are served by
+    the resident workers until stop(). On workers, start() blocks serving
+    the master and returns False after stop() was called on master.
+    Registrations last until then, so the pool keeps no references to
+    optimizers and models of finished steps."""
+    def __init__(self):
+        self.functions = []
+        self.active = False
 
-    def get_current_index(self):
-        return self.current_flat_index
+    def register(self, f):
+        """Returns id of f, registers it if necessary"""
+        for fid, g in enumerate(self.functions):
+            if g == f:
+                return fid
+        self.functions.append(f)
+        return len(self.functions) - 1
 
-    def next_items(self, n=None):
-        start = self.flat_index
-        if n is None:
-            end = self.data_count
-        else:
-            end = min(self.flat_index + n, self.data_count)
+    def get_fid(self, f):
+        for fid, g in enumerate(self.functions):
+            if g == f:
+                return fid
+        raise ValueError(f"{f} is not registered in the worker pool on all ranks")
 
-        for i in range(start, end):
-            index = self.flat_index_to_2D_index(self.flat_index)
-            yield (self.args[0][index[0]], self.args[1][index[1]]), {}, index
-            self.flat_index += 1
+    def start(self, *functions):
+        for f in functions:
+            self.register(f)
+        if global_rank == 0:
+            self.active = size > 1
+            return True
+        serve(self.functions)
+        self.functions = []
+        return False
 
-    def empty_results(self):
-        while self.received != self.data_count:
-            yield True
+    def stop(self):
+        if global_rank == 0 and self.active:
+            release_workers()
+            self.active = False
+        self.functions = []
 
-    def __len__(self):
-        return self.data_count
+    def everywhere(self, f, *args, **kwargs):
+        """Calls f on all ranks, e.g. functions containing collective calls.
+        Without an active pool the caller is expected to run SPMD anyway."""
+        if global_rank == 0 and self.active:
+            call = Pool_call(self.get_fid(f), args, kwargs)
+            for dest in children():
+                comm.send(call, dest=dest)
+            if options.instrumentation:
+                stats.sent(pickled_size(call)*len(children()), len(children()))
+        return f(*args, **kwargs)
 
-    def put_result(self, result_data):
-        result, elapsed, index = result_data
-        self.results[index[0]][index[1]] = result
-        self.elapsed[index[0]][index[1]] = elapsed
-        self.received += 1
+pool = Worker_pool()
 
-class Worker_killer():
+def children():
+    """Ranks receiving work directly from global master mapped to the number
+    of workers they represent. In hierarchical mode these are the ranks on
+    the master's machine and the node masters of the other machines."""
+    if not options.hierarchical:
+        return {dest: 1 for dest in range(1, size)}
+    weights = {}
+    for dest in range(1, size):
+        if namelist[dest] == namelist[0]:
+            weights[dest] = 1
+        elif namelist.index(namelist[dest]) == dest:
+            weights[dest] = max(1, namelist.count(namelist[dest]) - 1)
+    return weights
+
+def release_workers():
+    """Sends Worker_killer to all ranks served by global master"""
+    for dest in children():
+        comm.send(worker_killer, dest=dest)
+    if options.instrumentation:
+        stats.sent(pickled_size(worker_killer)*len(children()), len(children()))
+
+class Task():
+    """Chunk of work items in flight, possibly on several workers"""
+    def __init__(self, chunk):
+        self.indices = [index for args, kwargs, index in chunk]
+        self.items = [(args, kwargs) for args, kwargs, index in chunk]
+        self.start = time.time()
+        self.workers = []
+        self.sent = {}  # worker -> time of dispatch
+        self.finished = False
+
+    def age(self):
+        return time.time() - self.start
+
+    def running_time(self, dest):
+        return time.time() - self.sent[dest]
+
+class Comm_state():
+    """Scheduling state master() keeps between maps over a communicator,
+    rank numbers of node_comm and COMM_WORLD name different processes"""
     def __init__(self):
-        pass
-worker_killer = Worker_killer()
+        # workers still computing tasks which were finished without them (by
+        # a speculative copy or abandoned), their results are dropped on arrival
+        self.late_workers = {}
 
-def master(queue):
+        # ranks declared unresponsive (see options.set_fault_tolerance), they
+        # rejoin as soon as they answer
+        self.unresponsive = set()
+
+        # evaluation counters the workers reported with their last results
+        self.evals = {}
+
+comm_states = {}
+
+def comm_state(comm=comm):
+    return comm_states.setdefault(id(comm), Comm_state())
+
+# state of the maps over all ranks
+late_workers = comm_state(comm).late_workers
+unresponsive = comm_state(comm).unresponsive
+
+def degraded():
+    """True while some ranks are unresponsive or still busy with tasks
+    finished without them (abandoned or duplicated), collective calls over
+    all ranks would wait for them (meaningful on master)"""
+    return any(state.unresponsive or state.late_workers
+               for state in comm_states.values())
+
+def reported_evals(comm=comm):
+    """Sum of the evaluation counters last reported by the workers of comm,
+    replaces the collective sum while degraded()"""
+    return sum(comm_state(comm).evals.values())
+
+def master(queue, fid=0, comm=comm, weights=None):
     """
     This function dynamically saturates workers with data.
-    It must be executed on master (global_rank=0) only.
-    After all data have been used the function will colect last results
-    and send tag=0 to workes which breaks their worker loop.
-    The function called worker must therefore be executed on
-    all workes while this functin is being employed.
+    It must be executed on master (global_rank=0) or on node master
+    (with comm=node_comm) only.
+    Work items are shipped in chunks (see options.set_chunking) and the
+    master remembers which items each worker holds, so only arguments
+    travel to the workers and only (result, elapsed) pairs come back.
+    Parameter vectors and numeric results use buffer transport.
+    weights maps destination ranks to the number of workers behind them,
+    node masters get proportionally larger chunks.
+    Late tasks can be duplicated or abandoned (options.set_straggler_policy).
+    Tasks of unresponsive ranks are reassigned (options.set_fault_tolerance).
+    After all data have been used the function will colect last results.
+    Workers are then still waiting for instructions (see release_workers).
     """
-    if size == 1:
+    if weights is None:
+        weights = children()
+    if not weights:
         print("Run with more cores -> 1 for master rest for the workers")
         return None
 
-    # saturating workers
-    for i, data in enumerate(queue.next_items(n=size-1), 1):
-        comm.send(data, dest=i)
+    state = comm_state(comm)
+    late_workers, unresponsive = state.late_workers, state.unresponsive
+    workers = sum(weights.values())
+    pending = {dest: task for dest, task in late_workers.items() if dest in weights}
+    samples = []  # sorted round trip times per item of received tasks
+    retry = []    # tasks of unresponsive ranks waiting for a healthy worker
+
+    def dispatch(task, dest):
+        task.workers.append(dest)
+        task.sent[dest] = time.time()
+        pending[dest] = task
+        send_chunk(task.items, dest, fid, comm)
 
-    # receiving results and keeping workers saturated (dynamic scheduling)
-    for data in queue.next_items():
-        result_data = comm.recv(None, source=MPI.ANY_SOURCE, status=status)
-        queue.put_result(result_data)
-        comm.send(data, dest=status.Get_source())
+    def expected_time(task):
+        return samples[len(samples)//2]*len(task.indices)
 
-    # collect last results
-    for i in queue.empty_results():
-        result_data = comm.recv(None, source=MPI.ANY_SOURCE, status=status)
-        queue.put_result(result_data)
+    def timed_out(task, dest):
+        running_time = task.running_time(dest)
+        if running_time < options.task_timeout:
+            return False
+        if options.timeout_factor is None or not samples:
+            return True
+        return running_time > options.timeout_factor*expected_time(task)
 
-    # sending termination signal to the workers
-    for i in range(1, size):
-        comm.send(worker_killer, dest=i) # tag=0 breaks worker loop
+    def handle_unresponsive():
+        for dest, task in pending.items():
+            if dest in unresponsive or not timed_out(task, dest):
+                continue
+            unresponsive.add(dest)
+            print(f"Rank {dest} is unresponsive, its work is reassigned",
+                  file=sys.stderr)
+            if not task.finished and task not in retry:
+                retry.append(task)
+        healthy = [dest for dest in weights if dest not in unresponsive]
+        if not healthy:
+            # nobody left to do the work, report it as failed
+            for task in retry:
+                if not task.finished:
+                    for index in task.indices:
+                        queue.put_result((np.inf, task.age(), index))
+                    task.finished = True
+            retry.clear()
+            chunk = queue.next_chunk()
+            while chunk:
+                for args, kwargs, index in chunk:
+                    queue.put_result((np.inf, 0.0, index))
+                chunk = queue.next_chunk()
+            return
+        for dest in healthy:
+            if dest in pending:
+                continue
+            while retry and retry[0].finished:
+                retry.pop(0)
+            if not retry:
+                break
+            dispatch(retry.pop(0), dest)
+
+    def next_task(dest):
+        while retry:
+            task = retry.pop(0)
+            if not task.finished:
+                return task
+        chunk = queue.next_chunk(workers, weights[dest])
+        return Task(chunk) if chunk else None
+
+    def handle_stragglers():
+        late = [task for task in set(pending.values()) if not task.finished
+                and task.age() > options.straggler_factor*expected_time(task)]
+        late.sort(key=Task.age, reverse=True)
+        idle = [dest for dest in weights
+                if dest not in pending and dest not in unresponsive]
+        for task in late:
+            if options.abandon_factor is not None and \
+                    task.age() > options.abandon_factor*expected_time(task):
+                for index in task.indices:
+                    queue.put_result((np.inf, task.age(), index))
+                task.finished = True
+            elif options.speculative and idle and len(task.workers) == 1 \
+                    and queue.index == queue.data_count:
+                dispatch(task, idle.pop(0))
 
+    try:
+        # saturating workers
+        for dest, weight in weights.items():
+            if dest in pending or dest in unresponsive:
+                continue
+            chunk = queue.next_chunk(workers, weight)
+            if not chunk:
+                break
+            dispatch(Task(chunk), dest)
+
+        # receiving results and keeping workers saturated (dynamic scheduling)
+        polling = options.straggler_factor is not None or \
+            options.task_timeout is not None
+        while queue.received != queue.data_count:
+            if polling:
+                if not comm.Iprobe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG):
+                    if options.task_timeout is not None:
+                        handle_unresponsive()
+                    if options.straggler_factor is not None and \
+                            len(samples) >= options.straggler_samples:
+                        handle_stragglers()
+                    start = time.time()
+                    time.sleep(options.poll_interval)
+                    if options.instrumentation:
+                        stats.wait_time += time.time() - start
+                    if options.tracing:
+                        tracer.extend("wait", "cluster", start, time.time(),
+                                      2*options.poll_interval)
+                    continue
+            results, evals = receive_results(status, comm)
+            source = status.Get_source()
+            task = pending.pop(source, None)  # None if the map was interrupted
+            unresponsive.discard(source)
+            if evals is not None:
+                state.evals[source] = evals
+            if task is not None and not task.finished:  # first result wins
+                task.finished = True
+                # deadlines include dispatch and transport, not only the work
+                round_trip = task.running_time(source)/len(task.indices)
+                for index, (result, elapsed) in zip(task.indices, results):
+                    queue.put_result((result, elapsed, index))
+                    bisect.insort(samples, round_trip)
+            task = next_task(source)
+            if task is not None:
+                dispatch(task, source)
+    finally:
+        # tasks still in flight (the late ones, or all of them if master
+        # raised) are dropped when their results arrive in later maps
+        for task in pending.values():
+            task.finished = True
+        late_workers.clear()
+        late_workers.update(pending)
+    record_results(queue)
     return queue.results, queue.elapsed
 
-def worker(work):
-    """This function waits for data from master, executes work on them,
-    send result to master and waits for another instruction from master.
+def same_block(item, args, kwargs):
+    """True if item differs from (args, kwargs) only by its row"""
+    item_args, item_kwargs = item
+    return len(item_args) == len(args) and item_kwargs == kwargs and \
+        all(a is b for a, b in zip(item_args[1:], args[1:]))
+
+def evaluate_blocks(work, chunk):
+    """evaluate for vectorized work, items sharing all but the first
+    argument are stacked into one block of rows (wherever they are in the
+    chunk), results keep the order of the chunk"""
+    blocks = []  # (args, kwargs, positions in chunk) of every block
+    for position, (args, kwargs) in enumerate(chunk):
+        for block_args, block_kwargs, positions in reversed(blocks):
+            if same_block((args, kwargs), block_args, block_kwargs):
+                positions.append(position)
+                break
+        else:
+            blocks.append((args, kwargs, [position]))
+    results = [None]*len(chunk)
+    for args, kwargs, positions in blocks:
+        block = np.array([chunk[position][0][0] for position in positions])
+        timer = Timer()
+        try:
+            block_results = list(work(block, *args[1:], **kwargs))
+        except Exception as e:
+            if not options.catch_exceptions:
+                raise
+            print(f"Rank {global_rank}: {getattr(work, '__name__', work)} "
+                  f"raised {e!r}, reported as failed", file=sys.stderr)
+            block_results = [np.inf]*len(positions)
+        elapsed = timer.get_elapsed()
+        if options.tracing:
+            tracer.add(getattr(work, '__name__', "work"), "work",
+                       timer.start_time, timer.last_trigered)
+        for position, result in zip(positions, block_results):
+            results[position] = (result, elapsed/len(positions))
+    if options.instrumentation:
+        stats.items += len(results)
+        stats.compute_time += sum(elapsed for result, elapsed in results)
+    return results
+
+def evaluate(work, chunk):
+    """Executes work on every item of chunk, returns (result, elapsed) pairs"""
+    if is_vectorized(work):
+        return evaluate_blocks(work, chunk)
+    results = []
+    for args, kwargs in chunk:
+        timer = Timer()
+        try:
+            result = work(*args, **kwargs)
+        except Exception as e:
+            if not options.catch_exceptions:
+                raise
+            print(f"Rank {global_rank}: {getattr(work, '__name__', work)} "
+                  f"raised {e!r}, reported as failed", file=sys.stderr)
+            result = np.inf
+        results.append((result, timer.get_elapsed()))
+        if options.tracing:
+            tracer.add(getattr(work, '__name__', "work"), "work",
+                       timer.start_time, timer.last_trigered)
+    if options.instrumentation:
+        stats.items += len(results)
+        stats.compute_time += sum(elapsed for result, elapsed in results)
+    return results
+
+def record_results(queue):
+    """Memory taken by results of the finished map (instrumentation)"""
+    if options.instrumentation:
+        stats.result_bytes = deep_getsizeof(queue.results, set()) + \
+            deep_getsizeof(queue.elapsed, set())
+
+def work_loop(functions, comm=comm):
+    """This function waits for a chunk of data from master, executes the
+    requested function on every item, sends the (result, elapsed) pairs to
+    master and waits for another instruction from master.
     Worker_killer instance breaks out of this loop.
     """
     while True:
-        data = comm.recv(None, source=0)
-        if isinstance(data, Worker_killer):
+        message = receive_chunk(0, comm)
+        if isinstance(message, Worker_killer):
+            break
+        elif isinstance(message, Pool_call):
+            functions[message.fid](*message.args, **message.kwargs)
+            continue
+        fid, chunk = message
+        results = evaluate(functions[fid], chunk)
+        counter = evaluation_counter(functions[fid])
+        send_results(results, 0, comm, counter.evals if counter is not None else None)
+
+def node_master_loop(functions):
+    """Receives blocks of work from global master, schedules them over the
+    workers of this machine and returns results of the block at once.
+    Instructions of global master are forwarded to the node workers."""
+    node_workers = {dest: 1 for dest in range(1, node_size)}
+    while True:
+        message = receive_chunk(0, comm)
+        if isinstance(message, (Worker_killer, Pool_call)):
+            for dest in node_workers:
+                node_comm.send(message, dest=dest)
+            if isinstance(message, Worker_killer):
+                break
+            functions[message.fid](*message.args, **message.kwargs)
+            continue
+        fid, chunk = message
+        if node_workers:
+            queue = Chunk_queue(chunk)
+            queue.vectorized = is_vectorized(functions[fid])
+            results, elapsed = master(queue, fid, node_comm,
+                                      node_workers)
+            results = list(zip(results, elapsed))
+        else:
+            results = evaluate(functions[fid], chunk)
+        # counter of the machine: own evaluations and those of its workers
+        counter = evaluation_counter(functions[fid])
+        evals = counter.evals if counter is not None else 0
+        send_results(results, 0, comm, evals + reported_evals(node_comm))
+
+def serve(functions):
+    """Serves master with registered functions until Worker_killer.
+    In hierarchical mode workers of remote machines are served by their
+    node master instead of global master."""
+    if options.hierarchical and name != namelist[0]:
+        if local_rank == 0:
+            node_master_loop(functions)
+        else:
+            work_loop(functions, node_comm)
+    else:
+        work_loop(functions, comm)
+
+def worker(work):
+    """Serves master with a single work function until Worker_killer"""
+    serve([work])
+
+def node_map(work, queue):
+    """Evaluates queue by the ranks of this machine. Called on machine
+    master (local_rank 0) while the other ranks of the machine are in
+    serve_node(work), which they leave when the map is finished.
+    Lets every machine run its own optimization (island models)."""
+    queue.vectorized = is_vectorized(work)
+    if node_size == 1:
+        items = list(queue.next_items())
+        chunk = [(args, kwargs) for args, kwargs, index in items]
+        for (args, kwargs, index), (result, elapsed) in zip(
+                items, evaluate(work, chunk)):
+            queue.put_result((result, elapsed, index))
+        return queue.results, queue.elapsed
+    node_workers = {dest: 1 for dest in range(1, node_size)}
+    data = master(queue, 0, node_comm, node_workers)
+    for dest in node_workers:
+        node_comm.send(worker_killer, dest=dest)
+    return data
+
+def serve_node(work):
+    """Serves node_map of the machine master until it is finished"""
+    work_loop([work], node_comm)
+
+def run_map(work, queue):
+    queue.vectorized = is_vectorized(work)
+    if pool.active:
+        return master(queue, pool.get_fid(work))
+    try:
+        return master(queue)
+    finally:
+        release_workers()
+
+executor = None  # process/thread pool of the local backends
+
+def backend_size():
+    return options.backend_workers or os.cpu_count()
+
+def get_executor():
+    global executor
+    if executor is None:
+        workers = backend_size()
+        if options.backend == "process":
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+        elif options.backend == "thread":
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+    return executor
+
+def shutdown_executor():
+    global executor
+    if executor is not None:
+        executor.shutdown()
+        executor = None
+
+def evaluation_counter(work):
+    """Object counting evaluations of work (a model with evals, reached
+    directly or as the model M of an optimizer), None if there is none"""
+    owner = getattr(work, '__self__', None)
+    if owner is not None and not hasattr(owner, 'evals'):
+        owner = getattr(owner, 'M', None)
+    return owner if hasattr(owner, 'evals') else None
+
+def evaluate_counted(work, chunk):
+    """evaluate in a backend process, also returns the number of model
+    evaluations done there (the process works on a copy of the model)"""
+    counter = evaluation_counter(work)
+    evals = counter.evals if counter is not None else 0
+    results = evaluate(work, chunk)
+    return results, (counter.evals - evals if counter is not None else 0)
+
+def local_map(work, queue):
+    """Evaluates queue on master only, by the process/thread pool of
+    options.backend (dynamically, as the chunks finish) or serially.
+    Other ranks get (None, None)."""
+    if global_rank != 0:
+        return None, None
+    queue.vectorized = is_vectorized(work)
+    pool_executor = get_executor()
+    if pool_executor is None:
+        chunk = queue.next_chunk()
+        while chunk:
+            chunk_args = [(args, kwargs) for args, kwargs, index in chunk]
+            for (args, kwargs, index), (result, elapsed) in zip(
+                    chunk, evaluate(work, chunk_args)):
+                queue.put_result((result, elapsed, index))
+            chunk = queue.next_chunk()
+        record_results(queue)
+        return queue.results, queue.elapsed
+
+    workers = backend_size()
+    running = {}  # future -> indices of its items
+    counted = options.backend == "process"
+    process_evals = 0
+
+    def submit(chunk):
+        chunk_args = [(args, kwargs) for args, kwargs, index in chunk]
+        if counted:
+            future = pool_executor.submit(evaluate_counted, work, chunk_args)
+        else:
+            future = pool_executor.submit(evaluate, work, chunk_args)
+        running[future] = [index for args, kwargs, index in chunk]
+
+    for i in range(workers):
+        chunk = queue.next_chunk(workers)
+        if not chunk:
             break
+        submit(chunk)
+    while running:
         timer = Timer()
-        args, kwargs, index = data
-        result = work(*args, **kwargs)
-        elapsed = timer.get_elapsed()
-        comm.send((result, elapsed, index), dest=0)
+        done, not_done = concurrent.futures.wait(
+            running, return_when=concurrent.futures.FIRST_COMPLETED)
+        if options.instrumentation:
+            stats.wait_time += timer.get_elapsed()
+        for future in done:
+            results = future.result()
+            if counted:
+                results, evals = results
+                process_evals += evals
+            for index, (result, elapsed) in zip(running.pop(future), results):
+                queue.put_result((result, elapsed, index))
+            chunk = queue.next_chunk(workers)
+            if chunk:
+                submit(chunk)
+
+    # processes evaluated copies of the model, keep its counter up to date
+    counter = evaluation_counter(work)
+    if counted and counter is not None:
+        counter.evals += process_evals
+    record_results(queue)
+    return queue.results, queue.elapsed
+
+def static_map(work, queue):
+    """Evaluates all items of queue spread evenly over all ranks including
+    master (Scatterv/Gatherv), no dynamic scheduling. Items are dealt
+    round-robin in dispatch order so expensive items (see cost ordering)
+    do not pile up on one rank.
+    Must be called on all ranks, queue is needed on master only."""
+    if global_rank == 0:
+        queue.vectorized = is_vectorized(work)
+        items = list(queue.next_items())
+        counts = [len(items[r::size]) for r in range(size)]
+        items = [item for r in range(size) for item in items[r::size]]
+        rows = [args[0] for args, kwargs, index in items
+                if len(args) == 1 and not kwargs and is_row(args[0])]
+        if rows and len(rows) == len(items) \
+                and all(row.size == rows[0].size for row in rows):
+            m = rows[0].size
+        else:
+            m = None
+        counts, m = comm.bcast((counts, m), root=0)
+    else:
+        counts, m = comm.bcast(None, root=0)
+    counts = np.array(counts)
+    displs = np.cumsum(counts) - counts
+
+    # distributing the items
+    if m is not None:
+        chunk = np.empty((counts[global_rank], m))
+        if global_rank == 0:
+            sendbuf = [np.stack(rows), (counts*m, displs*m), MPI.DOUBLE]
+        else:
+            sendbuf = None
+        with Span("scatter", "cluster"):
+            comm.Scatterv(sendbuf, chunk, root=0)
+        if options.instrumentation:
+            if global_rank == 0:
+                stats.sent(8*m*(counts.sum() - counts[0]), size - 1)
+            else:
+                stats.received(chunk.nbytes)
+        chunk = [((row,), {}) for row in chunk]
+    else:
+        if global_rank == 0:
+            parts = [[(args, kwargs) for args, kwargs, index in items[d:d+c]]
+                     for d, c in zip(displs, counts)]
+        else:
+            parts = None
+        with Span("scatter", "cluster"):
+            chunk = comm.scatter(parts, root=0)
+        if options.instrumentation:
+            if global_rank == 0:
+                stats.sent(sum(pickled_size(part) for part in parts[1:]), size - 1)
+            else:
+                stats.received(pickled_size(chunk))
+
+    # evaluating own part and collecting the results
+    results = evaluate(work, chunk)
+    timer = Timer()  # ranks done early wait for the others here
+    if comm.allreduce(all(is_number(r) for r, e in results), op=MPI.LAND):
+        sendbuf = np.array(results, dtype=np.float64).reshape(-1)
+        if global_rank == 0:
+            gathered = np.empty(2*counts.sum())
+            recvbuf = [gathered, (2*counts, 2*displs), MPI.DOUBLE]
+        else:
+            recvbuf = None
+        with Span("gather", "cluster"):
+            comm.Gatherv(sendbuf, recvbuf, root=0)
+        if options.instrumentation:
+            if global_rank == 0:
+                stats.received(16*(counts.sum() - counts[0]), size - 1)
+            else:
+                stats.sent(sendbuf.nbytes)
+        if global_rank == 0:
+            results = gathered.reshape(-1, 2).tolist()
+    else:
+        with Span("gather", "cluster"):
+            parts = comm.gather(results, root=0)
+        if options.instrumentation:
+            if global_rank == 0:
+                stats.received(sum(pickled_size(part) for part in parts[1:]), size - 1)
+            else:
+                stats.sent(pickled_size(results))
+        if global_rank == 0:
+            results = [pair for part in parts for pair in part]
+    if options.instrumentation:
+        stats.wait_time += timer.get_elapsed()
+
+    if global_rank == 0:
+        for (args, kwargs, index), (result, elapsed) in zip(items, results):
+            queue.put_result((result, elapsed, index))
+        record_results(queue)
+        return queue.results, queue.elapsed
+    return None, None
+
+def static_sequential_map(work, *args, **kwargs):
+    """Like sequential_map but statically partitioned over all ranks"""
+    queue = Sequential_queue(args, kwargs) if global_rank == 0 else None
+    if options.backend != "mpi" or size == 1:
+        return local_map(work, queue)
+    return static_map(work, queue)
+
+def static_product_map(work, *axes, reduce=None, axis=()):
+    """Like product_map but statically partitioned over all ranks"""
+    queue = Product_queue(axes, reduce, axis) if global_rank == 0 else None
+    if options.backend != "mpi" or size == 1:
+        return local_map(work, queue)
+    return static_map(work, queue)
+
+def static_2d_product_map(work, *args, reduce=None):
+    """Like _2d_product_map but statically partitioned over all ranks"""
+    return static_product_map(work, *args, reduce=reduce, axis=1)
+
+def async_map(work, source, sink, count):
+    """Steady-state scheduling of count evaluations of work, see Async_queue.
+    Results are consumed by sink, returns (None, elapsed times) on master."""
+    queue = Async_queue(source, sink, count) if global_rank == 0 else None
+    if options.backend != "mpi" or size == 1:
+        return local_map(work, queue)
+    if global_rank == 0:
+        return run_map(work, queue)
+    else:
+        worker(work)
+        return None, None
 
 def sequential_map(work, *args, **kwargs):
     """Order preserving scheduling of work with data as argument"""
+    if options.backend != "mpi" or size == 1:
+        return static_sequential_map(work, *args, **kwargs)
     if global_rank == 0:
         queue = Sequential_queue(args, kwargs)
-        return master(queue)
+        return run_map(work, queue)
     else:
         worker(work)
         return None, None
 
-def _2d_product_map(work, *args):
-    """Order preserving scheduling of work with data as argument"""
+def product_map(work, *axes, reduce=None, axis=()):
+    """Order preserving scheduling of work over the cartesian product of
+    axes, work gets one item of every axis. Returns arrays of shape
+    (len(axes[0]), len(axes[1]), ...). Numeric results can be reduced over
+    axis (int or tuple) by a binary ufunc with identity (e.g. reduce=np.add)
+    as they arrive, the reduced axes are then dropped from the shape."""
+    if options.backend != "mpi" or size == 1:
+        return static_product_map(work, *axes, reduce=reduce, axis=axis)
     if global_rank == 0:
-        queue = _2D_Product_queue(args)
-        return master(queue)
+        queue = Product_queue(axes, reduce, axis)
+        return run_map(work, queue)
     else:
         worker(work)
         return None, None
 
+def _2d_product_map(work, *args, reduce=None):
+    """Order preserving scheduling of work with data as argument.
+    Numeric results can be reduced along the second axis by a binary ufunc
+    with identity (e.g. reduce=np.add) as they arrive."""
+    return product_map(work, *args, reduce=reduce, axis=1)
+
 def broadcast(object, root=0):
     """Broadcast by assignment."""
     return comm.bcast(object, root=root)
@@ -261,6 +1586,11 @@ def broadcast(object, root=0):
 def Broadcast(object, root=0):
     """Broadcast to buffer. e.g. numpy arrays."""
     comm.Bcast(object, root=root)
+    if options.instrumentation and size > 1:
+        if global_rank == root:
+            stats.sent(object.nbytes*(size - 1), size - 1)
+        else:
+            stats.received(object.nbytes)
 
 def collect(data, source, dest=0):
     """Ask for data from source and deliver to the destination (defaults to master)"""
@@ -272,17 +1602,22 @@ def collect(data, source, dest=0):
 
 def sum_all(data, dest=0):
     "Returns sum acumulated across all nodes"
+    if MPI is None:
+        return data
     return comm.reduce(data, op=MPI.SUM, root=dest)
 
 def deep_getsizeof(o, ids):
+    """Size of o in bytes including referenced objects not in ids"""
     if id(o) in ids:
         return 0
     r = sys.getsizeof(o)
     ids.add(id(o))
     if isinstance(o, str) or isinstance(o, bytes):
         return r
+    if isinstance(o, np.ndarray) and o.dtype != object:
+        return r if o.base is None else r + o.nbytes
     if isinstance(o, Mapping):
-        return r + sum(deep_getsizeof(k, ids) + deep_getsizeof(v, ids) for k, v in o.iteritems())
+        return r + sum(deep_getsizeof(k, ids) + deep_getsizeof(v, ids) for k, v in o.items())
     if isinstance(o, Container):
         return r + sum(deep_getsizeof(x, ids) for x in o)
     return r
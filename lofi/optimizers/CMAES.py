@@ -0,0 +1,129 @@
+from .optimizer import Optimizer, cluster, np
+
+class CMAES(Optimizer):
+    def __init__(self, M=None, n=None, sigma=0.5, bound_control=True,
+                 sparse=False, sparsity_weight=1.0):
+
+        self.n = n            # population size (None -> 4 + 3*ln(m))
+        self.sigma0 = sigma   # initial step size
+
+        super().__init__(M=M, bound_control=bound_control, sparse=sparse,
+                         sparsity_weight=sparsity_weight)
+
+    @cluster.on_master
+    def initialize_state(self):
+        self.iter = 0
+        self.generation = 0
+        m = self.M.m
+        if self.n is None:
+            self.n = 4 + int(3*np.log(m))
+
+        self.initialize_weights()
+
+        # distribution state
+        self.mean = self.M.p.copy()
+        self.sigma = self.sigma0
+        self.ps = np.zeros(m)  # evolution path of step size
+        self.pc = np.zeros(m)  # evolution path of covariance
+        self.chi = np.sqrt(m)*(1 - 1/(4*m) + 1/(21*m**2))  # E||N(0, I)||
+        self.initialize_covariance()
+
+        # population
+        self.p = np.zeros((self.n, m))
+        self.y = np.full(self.n, np.inf)
+
+    @cluster.on_master
+    def initialize_weights(self):
+        # recombination weights of the mu best samples
+        self.mu = self.n//2
+        w = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = w/w.sum()
+        self.mueff = 1/np.sum(self.weights**2)
+        self.initialize_learning_rates()
+
+    @cluster.on_master
+    def resize_population(self, n):
+        self.n = n
+        self.initialize_weights()
+        self.p = np.zeros((n, self.M.m))
+        self.y = np.full(n, np.inf)
+
+    def population_diameter(self):
+        return 2*self.sigma*self.D.max()
+
+    @cluster.on_master
+    def initialize_learning_rates(self):
+        m, mueff = self.M.m, self.mueff
+        self.cc = (4 + mueff/m)/(m + 4 + 2*mueff/m)
+        self.cs = (mueff + 2)/(m + mueff + 5)
+        self.c1 = 2/((m + 1.3)**2 + mueff)
+        self.cmu = min(1 - self.c1, 2*(mueff - 2 + 1/mueff)/((m + 2)**2 + mueff))
+        self.damps = 1 + 2*max(0, np.sqrt((mueff - 1)/(m + 1)) - 1) + self.cs
+        self.eigen_gap = max(1, int(1/(10*m*(self.c1 + self.cmu))))
+
+    @cluster.on_master
+    def initialize_covariance(self):
+        m = self.M.m
+        self.C = np.eye(m)
+        self.B = np.eye(m)    # eigenvectors of C
+        self.D = np.ones(m)   # square roots of eigenvalues of C
+
+    @cluster.on_master
+    def sample_directions(self, z):
+        """Maps rows of standard normal z to N(0, C)"""
+        return (z*self.D).dot(self.B.T)
+
+    @cluster.on_master
+    def whiten(self, step):
+        """Returns C^(-1/2) step"""
+        return self.B.dot(self.B.T.dot(step)/self.D)
+
+    @cluster.on_master
+    def update_covariance(self, hsig, steps, weights):
+        rank_one = np.outer(self.pc, self.pc) + \
+            (1 - hsig)*self.cc*(2 - self.cc)*self.C
+        rank_mu = (steps.T*weights).dot(steps)
+        self.C *= 1 - self.c1 - self.cmu
+        self.C += self.c1*rank_one + self.cmu*rank_mu
+
+        # eigen decomposition is amortized over several generations
+        if self.generation % self.eigen_gap == 0:
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            eigenvalues, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(eigenvalues, 1e-20))
+
+    @cluster.on_master
+    def generate_new_samples(self):
+        z = np.random.normal(0, 1, (self.n, self.M.m))
+        self.p[:] = self.mean + self.sigma*self.sample_directions(z)
+
+    @cluster.on_master
+    def update_model(self):
+        order = np.argsort(self.y)
+        best_idx = order[0]
+        if self.M.y > self.y[best_idx]:
+            self.M.p = self.p[best_idx].copy()
+
+        # failed samples do not take part in the recombination
+        selected = [i for i in order[:self.mu] if np.isfinite(self.y[i])]
+        if not selected:
+            return
+        weights = self.weights[:len(selected)]/self.weights[:len(selected)].sum()
+
+        # steps of the (possibly clipped) samples in units of sigma
+        steps = (self.p[selected] - self.mean)/self.sigma
+        step = weights.dot(steps)
+        self.mean = self.mean + self.sigma*step
+        self.generation += 1
+
+        # evolution paths
+        self.ps *= 1 - self.cs
+        self.ps += np.sqrt(self.cs*(2 - self.cs)*self.mueff)*self.whiten(step)
+        norm_ps = np.linalg.norm(self.ps)
+        hsig = norm_ps/np.sqrt(1 - (1 - self.cs)**(2*self.generation)) \
+            < (1.4 + 2/(self.M.m + 1))*self.chi
+        self.pc *= 1 - self.cc
+        self.pc += hsig*np.sqrt(self.cc*(2 - self.cc)*self.mueff)*step
+
+        self.update_covariance(hsig, steps, weights)
+        self.sigma *= np.exp(self.cs/self.damps*(norm_ps/self.chi - 1))
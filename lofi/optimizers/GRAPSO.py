@@ -13,12 +13,21 @@ class GRAPSO(PSO):
         # update model
         best_idx = np.nanargmin(self.y)
         if self.M.y > self.y[best_idx]:
-            self.M.p = self.p[best_idx,:]
+            self.M.p = self.p[best_idx,:].copy()  # particles move in place
         else:
-            # adapt swarm weights
-            if np.random.random() > 0.5:
-                self.w = 0.3 + 0.6*np.random.random()
-            if np.random.random() > 0.5:
-                self.c1 = 1.5 + np.random.random()
-            if np.random.random() > 0.5:
-                self.c2 = 1.5 + np.random.random()
+            self.adapt_weights()
+
+    @cluster.on_master
+    def adapt_weights(self):
+        if np.random.random() > 0.5:
+            self.w = 0.3 + 0.6*np.random.random()
+        if np.random.random() > 0.5:
+            self.c1 = 1.5 + np.random.random()
+        if np.random.random() > 0.5:
+            self.c2 = 1.5 + np.random.random()
+
+    @cluster.on_master
+    def async_epoch(self):
+        if self.gbest_improved == 0:
+            self.adapt_weights()
+        self.gbest_improved = 0
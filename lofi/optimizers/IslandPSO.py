@@ -0,0 +1,170 @@
+from .optimizer import Optimizer, cluster, np
+from .PSO import PSO
+from contextlib import contextmanager
+
+class IslandPSO(PSO):
+    """Island model of PSO. Every machine runs its own swarm of n particles
+    with its own gbest, its machine master (local_rank 0) schedules the
+    evaluations over the ranks of the machine only. Every k steps the
+    islands exchange their best particles (ring topology), so only a few
+    vectors per machine cross the network. Master reports the best island."""
+    def __init__(self, M=None, n=40, w=0.7, c1=2.0, c2=2.0, k=10, migrants=2,
+                 bound_control=True, sparse=False, sparsity_weight=1.0):
+
+        self.k = k                # steps between migrations
+        self.migrants = migrants  # particles sent to the next island
+
+        super().__init__(M=M, n=n, w=w, c1=c1, c2=c2,
+                         bound_control=bound_control, sparse=sparse,
+                         sparsity_weight=sparsity_weight)
+
+    # swarm of every island lives on its machine master, master alone can
+    # neither resize nor save the islands
+
+    def set_adaptive_population(self, *args, **kwargs):
+        raise ValueError("IslandPSO has no adaptive population")
+
+    def set_checkpointing(self, filename="lofi_checkpoint.npz", every=10):
+        if filename is not None:
+            raise ValueError("IslandPSO has no periodic checkpoints")
+        super().set_checkpointing(filename, every)
+
+    @cluster.on_machine
+    def initialize_state(self):
+        PSO.initialize_state.__wrapped__(self)
+        self.best_p = self.M.p.copy()  # best of all islands (master)
+        self.best_y = self.M.y
+
+    def initialize_parameter_array(self):
+        if cluster.local_rank == 0:
+            self.p_array = np.zeros((self.n + 1, self.M.m))
+        else:
+            self.p_array = None
+
+    @cluster.on_machine
+    def update_pbest(self):
+        PSO.update_pbest.__wrapped__(self)
+
+    @cluster.on_machine
+    def update_particle_positions(self):
+        PSO.update_particle_positions.__wrapped__(self)
+
+    @cluster.on_machine
+    def generate_new_samples(self):
+        PSO.generate_new_samples.__wrapped__(self)
+
+    @cluster.on_machine
+    def enforce_bounds_on_samples(self):
+        Optimizer.enforce_bounds_on_samples.__wrapped__(self)
+
+    @cluster.on_machine
+    def fill_parameter_array(self):
+        Optimizer.fill_parameter_array.__wrapped__(self)
+
+    @cluster.on_machine
+    def resolve_results(self, elapsed):
+        Optimizer.resolve_results.__wrapped__(self, elapsed)
+
+    @cluster.on_machine
+    def update_model(self):
+        PSO.update_model.__wrapped__(self)
+
+    @cluster.on_machine
+    def update_iteration_counter(self):
+        self.iter += 1
+
+    def evaluate_samples(self, x=None):
+        if cluster.local_rank != 0:
+            cluster.serve_node(self.M.eval_objective)
+            return
+        if x is None:
+            queue = cluster.Sequential_queue((self.p_array,), {})
+        else:
+            # loss of each candidate is summed over all inputs on the fly
+            queue = cluster.Product_queue((self.p_array, x), np.add, 1)
+        data = cluster.node_map(self.M.eval_objective, queue)
+        self.results = data[0]
+        self.resolve_results(data[1])
+
+    @cluster.on_machine
+    def migrate(self):
+        """Best particles of every island replace the worst particles of the
+        next island if they are better"""
+        best = np.argsort(self.pbest_y)[:self.migrants]
+        islands = cluster.leader_comm.allgather(
+            (self.pbest_y[best], self.pbest_p[best]))
+        rank = cluster.leader_comm.Get_rank()
+        y_in, p_in = islands[rank - 1]
+        worst = np.argsort(self.pbest_y)[::-1][:len(y_in)]
+        better = y_in < self.pbest_y[worst]
+        worst, y_in, p_in = worst[better], y_in[better], p_in[better]
+        self.pbest_y[worst] = y_in
+        self.pbest_p[worst] = p_in
+        self.p[worst] = p_in
+        self.v[worst] = 0.0
+        if y_in.size and y_in.min() < self.M.y:
+            self.M.y = y_in.min()
+            self.M.p = p_in[np.argmin(y_in)].copy()
+
+    @cluster.on_machine
+    def gather_islands(self):
+        """Best of all islands is collected on master"""
+        islands = cluster.leader_comm.gather((self.M.y, self.M.p), root=0)
+        if cluster.global_rank == 0:
+            y, p = min(islands, key=lambda island: island[0])
+            if y <= self.best_y:
+                self.best_y, self.best_p = y, p.copy()
+
+    @contextmanager
+    def reporting_best(self):
+        """Model of master holds the best of all islands meanwhile"""
+        if cluster.global_rank != 0:
+            yield
+            return
+        island = self.M.p, self.M.y
+        self.M.p, self.M.y = self.best_p, self.best_y
+        try:
+            yield
+        finally:
+            self.M.p, self.M.y = island
+
+    def step(self, x=None, n=1):
+        """Performs n steps of all islands, must be called on all ranks.
+        Model of every machine master keeps the gbest of its island, the
+        best of all islands is in best_p and best_y of master (or in its
+        model within reporting_best())."""
+        for i in range(n):
+            self.single_step(x)
+
+    def run(self, x=None, max_steps=None):
+        """Steps all islands until a stopping criterion (see set_stopping)
+        holds for the best of all islands or max_steps were done.
+        Must be called on all ranks, as step."""
+        self.start_run(max_steps)
+        self.run_spmd(x, max_steps)
+
+    def single_step(self, x=None):
+        step_timer = cluster.Timer()
+        with cluster.Span("generate_new_samples", "optimizer"):
+            self.generate_new_samples()
+            self.enforce_bounds_on_samples()
+            self.fill_parameter_array()
+        with cluster.Span("evaluate_samples", "optimizer"):
+            self.evaluate_samples(x)
+        with cluster.Span("update_model", "optimizer"):
+            self.update_model()
+
+        self.update_iteration_counter()
+        if cluster.local_rank == 0 and self.iter % self.k == 0:
+            self.migrate()
+        self.gather_islands()
+        with self.reporting_best():
+            with cluster.Span("update_log", "optimizer"):
+                self.update_log()
+            self.update_cluster_stats()
+            self.update_console_table()
+        self.step_time = step_timer.get_elapsed()
+        self.total_time += self.step_time
+        with self.reporting_best():
+            self.update_stagnation()
+            self.check_termination()
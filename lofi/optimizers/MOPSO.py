@@ -0,0 +1,65 @@
+from .pareto import Multi_objective, crowding_distance, cluster, np
+
+class MOPSO(Multi_objective):
+    def __init__(self, M=None, n=100, w=0.4, c1=1.5, c2=1.5, archive_size=1000,
+                 bound_control=True, sparse=False, sparsity_weight=1.0):
+
+        self.n = n    # population size
+        self.w = w    # inertia weight
+        self.c1 = c1  # cognitive weight
+        self.c2 = c2  # social weight (towards a leader from the archive)
+
+        super().__init__(M=M, archive_size=archive_size,
+                         bound_control=bound_control, sparse=sparse,
+                         sparsity_weight=sparsity_weight)
+
+    @cluster.on_master
+    def initialize_state(self):
+        self.p = np.random.uniform(self.M.p_lb, self.M.p_ub, (self.n, self.M.m))  # particle positions
+        self.v = np.zeros((self.n, self.M.m))  # particle velocities
+        self.pbest_p = self.p.copy()            # personal best positions
+        self.pbest_F = None                     # personal best objectives
+        self.y = np.full(self.n, np.inf)
+
+    @cluster.on_master
+    def select_leaders(self):
+        """Archive member for every particle, binary tournaments prefer the
+        less crowded regions of the front"""
+        if len(self.archive) == 0:
+            return self.pbest_p
+        crowding = crowding_distance(self.archive.F)
+        i, j = np.random.randint(0, len(self.archive), (2, self.n))
+        return self.archive.P[np.where(crowding[i] >= crowding[j], i, j)]
+
+    @cluster.on_master
+    def update_pbest(self):
+        """New position replaces personal best if it dominates it, if none
+        of them dominates the other the choice is random"""
+        if self.pbest_F is None:
+            self.pbest_p, self.pbest_F = self.p.copy(), self.F.copy()
+            return
+        F = np.nan_to_num(self.F, nan=np.inf)
+        not_worse = np.all(F <= self.pbest_F, axis=1)
+        better = np.any(F < self.pbest_F, axis=1)
+        dominated = np.all(self.pbest_F <= F, axis=1) & np.any(self.pbest_F < F, axis=1)
+        replaced = (not_worse & better) | \
+            (~dominated & ~(not_worse & better) & (np.random.random(self.n) < 0.5))
+        self.pbest_p[replaced] = self.p[replaced]
+        self.pbest_F[replaced] = F[replaced]
+
+    @cluster.on_master
+    def generate_new_samples(self):
+        if self.pbest_F is None:
+            return  # initial swarm is not evaluated yet
+        leaders = self.select_leaders()
+        r1 = np.random.random(self.n)[:, None]
+        r2 = np.random.random(self.n)[:, None]
+        self.v *= self.w                              # momentum component
+        self.v += self.c1*r1*(self.pbest_p - self.p)  # cognitive component
+        self.v += self.c2*r2*(leaders - self.p)       # social component
+        self.p += self.v
+
+    @cluster.on_master
+    def update_model(self):
+        self.update_archive()
+        self.update_pbest()
@@ -0,0 +1,83 @@
+from .pareto import Multi_objective, non_dominated_sort, crowding_distance, cluster, np
+
+class NSGA2(Multi_objective):
+    def __init__(self, M=None, n=100, crossover_prob=0.9, crossover_eta=15.0,
+                 mutation_prob=None, mutation_eta=20.0, archive_size=1000,
+                 bound_control=True, sparse=False, sparsity_weight=1.0):
+
+        self.n = n                            # population size
+        self.crossover_prob = crossover_prob  # probability of SBX per pair
+        self.crossover_eta = crossover_eta    # SBX distribution index
+        self.mutation_prob = mutation_prob    # per gene (None -> 1/m)
+        self.mutation_eta = mutation_eta      # polynomial mutation index
+
+        super().__init__(M=M, archive_size=archive_size,
+                         bound_control=bound_control, sparse=sparse,
+                         sparsity_weight=sparsity_weight)
+
+    @cluster.on_master
+    def initialize_state(self):
+        # first generation is uniform, its offspring come after evaluation
+        self.p = np.random.uniform(self.M.p_lb, self.M.p_ub, (self.n, self.M.m))
+        self.y = np.full(self.n, np.inf)
+        self.parents_p = None
+        self.parents_F = None
+
+    @cluster.on_master
+    def tournament(self, count):
+        """Indices of parents winning binary tournaments on (front, crowding)"""
+        i, j = np.random.randint(0, len(self.parents_p), (2, count))
+        better = (self.rank[i] < self.rank[j]) | \
+            ((self.rank[i] == self.rank[j]) & (self.crowding[i] > self.crowding[j]))
+        return np.where(better, i, j)
+
+    @cluster.on_master
+    def crossover(self, a, b):
+        """Simulated binary crossover of rows of a and b"""
+        eta = self.crossover_eta
+        u = np.random.random(a.shape)
+        beta = np.where(u <= 0.5, (2*u)**(1/(eta + 1)),
+                        (1/(2*(1 - u)))**(1/(eta + 1)))
+        # half of the genes of the crossing pairs are recombined
+        crossing = np.random.random(len(a))[:, None] < self.crossover_prob
+        beta = np.where(crossing & (np.random.random(a.shape) < 0.5), beta, 1.0)
+        c1 = 0.5*((1 + beta)*a + (1 - beta)*b)
+        c2 = 0.5*((1 - beta)*a + (1 + beta)*b)
+        return np.vstack((c1, c2))
+
+    @cluster.on_master
+    def mutate(self, p):
+        """Polynomial mutation of rows of p in place"""
+        eta = self.mutation_eta
+        prob = 1/self.M.m if self.mutation_prob is None else self.mutation_prob
+        u = np.random.random(p.shape)
+        delta = np.where(u < 0.5, (2*u)**(1/(eta + 1)) - 1,
+                         1 - (2*(1 - u))**(1/(eta + 1)))
+        mutated = np.random.random(p.shape) < prob
+        p += mutated*delta*(self.M.p_ub - self.M.p_lb)
+
+    @cluster.on_master
+    def generate_new_samples(self):
+        if self.parents_p is None:
+            return  # initial population is not evaluated yet
+        pairs = (self.n + 1)//2
+        a = self.parents_p[self.tournament(pairs)]
+        b = self.parents_p[self.tournament(pairs)]
+        self.p = self.crossover(a, b)[:self.n]
+        self.mutate(self.p)
+
+    @cluster.on_master
+    def update_model(self):
+        self.update_archive()
+
+        # elitist selection from parents and offspring by (front, crowding)
+        if self.parents_p is None:
+            P, F = self.p, self.F
+        else:
+            P = np.vstack((self.parents_p, self.p))
+            F = np.vstack((self.parents_F, self.F))
+        rank = non_dominated_sort(F)
+        crowding = crowding_distance(F, rank)
+        selected = np.lexsort((-crowding, rank))[:self.n]
+        self.parents_p, self.parents_F = P[selected], F[selected]
+        self.rank, self.crowding = rank[selected], crowding[selected]
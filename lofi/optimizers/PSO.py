@@ -21,6 +21,23 @@ class PSO(Optimizer):
         self.y = np.full(self.n, np.inf)             # particle actual values
         self.pbest_y = np.full(self.n, np.inf)       # particle personal best values
 
+    @cluster.on_master
+    def resize_population(self, n):
+        if n < self.n:
+            # the particles with best personal bests survive
+            keep = np.argsort(self.pbest_y)[:n]
+            self.p, self.v = self.p[keep], self.v[keep]
+            self.pbest_p, self.pbest_y = self.pbest_p[keep], self.pbest_y[keep]
+            self.y = self.y[keep]
+        else:
+            new = n - self.n
+            self.p = np.vstack((self.p, np.random.uniform(self.M.p_lb, self.M.p_ub, (new, self.M.m))))
+            self.v = np.vstack((self.v, np.zeros((new, self.M.m))))
+            self.pbest_p = np.vstack((self.pbest_p, np.zeros((new, self.M.m))))
+            self.pbest_y = np.concatenate((self.pbest_y, np.full(new, np.inf)))
+            self.y = np.concatenate((self.y, np.full(new, np.inf)))
+        self.n = n
+
     @cluster.on_master
     def update_pbest(self):
         idxs = np.where(self.y < self.pbest_y)[0]
@@ -37,6 +54,16 @@ class PSO(Optimizer):
         self.v += self.c2*r2*(self.M.p - self.p)      # social component
         self.p += self.v
 
+    @cluster.on_master
+    def move_particle(self, i):
+        r1, r2 = np.random.random(2)
+        self.v[i] *= self.w
+        self.v[i] += self.c1*r1*(self.pbest_p[i] - self.p[i])
+        self.v[i] += self.c2*r2*(self.M.p - self.p[i])
+        self.p[i] += self.v[i]
+        if self.bound_control:
+            np.clip(self.p[i], self.M.p_lb, self.M.p_ub, out=self.p[i])
+
     @cluster.on_master
     def generate_new_samples(self):
         self.update_pbest()
@@ -46,5 +73,30 @@ class PSO(Optimizer):
     def update_model(self):
         best_idx = np.nanargmin(self.y)
         if self.M.y > self.y[best_idx]:
-            self.M.p = self.p[best_idx,:]
+            self.M.p = self.p[best_idx,:].copy()  # particles move in place
+
+    @cluster.on_master
+    def initialize_async(self):
+        self.enforce_bounds_on_samples()
+        self.free = list(range(self.n))  # particles ready for evaluation
+        self.gbest_improved = 0          # gbest improvements in this epoch
+
+    @cluster.on_master
+    def async_sample(self):
+        if self.free:
+            i = self.free.pop(0)
+            return i, self.p[i].copy()
+
+    @cluster.on_master
+    def async_result(self, i, y):
+        self.y[i] = y
+        if y < self.pbest_y[i]:
+            self.pbest_y[i] = y
+            self.pbest_p[i] = self.p[i]
+        if y < self.M.y:
+            self.M.p = self.p[i].copy()
+            self.M.y = y
+            self.gbest_improved += 1
+        self.move_particle(i)
+        self.free.append(i)
 
@@ -25,6 +25,12 @@ class RS(Optimizer):
         self.z = np.random.normal(0, 1, (self.n, self.M.m))
         self.p = self.M.p + self.sigma*self.z
 
+    @cluster.on_master
+    def resize_population(self, n):
+        self.n = n
+        self.p = np.zeros((n, self.M.m))
+        self.y = np.full(n, np.inf)
+
     @cluster.on_master
     def update_model(self):
         best_idx = np.nanargmin(self.y)
@@ -1,13 +1,20 @@
 from .optimizer import Optimizer, cluster, np
 
 class VanillaES(Optimizer):
-    def __init__(self, M=None, n=19, lr=0.01, sigma=1e-2,
+
+    partial_evaluation = False  # gradient needs both losses of every pair
+
+    def __init__(self, M=None, n=19, lr=0.01, sigma=1e-2, seed_sharing=False,
                  bound_control=True, sparse=False, sparsity_weight=1.0):
         
         self.n = n
         self.lr = lr
         self.sigma = sigma
 
+        # workers regenerate the noise from seeds instead of receiving the
+        # perturbed parameter vectors (traffic O(n) instead of O(n*m))
+        self.seed_sharing = seed_sharing
+
         super().__init__(M=M, bound_control=bound_control, sparse=sparse, 
                          sparsity_weight=sparsity_weight)
         
@@ -15,28 +22,152 @@ class VanillaES(Optimizer):
     def noise(self):
         return np.random.normal(0, 1, (self.n, self.M.m))
 
+    def seed_noise(self, seed):
+        """Reproducible perturbation of the sample with given seed"""
+        return np.random.default_rng(seed).standard_normal(self.M.m)
+
     @cluster.on_master
     def initialize_state(self):
         self.iter = 0
+        self.epsilon = None  # noise of the pairs (None with seed sharing)
 
-        # initial population allocation
-        self.p = np.zeros((2*self.n, self.M.m))
+        # initial population allocation, with seed sharing samples are
+        # [seed, sign] rows (sign 0 stands for the current parameters)
+        if self.seed_sharing:
+            self.p = np.zeros((2*self.n, 2))
+        else:
+            self.p = np.zeros((2*self.n, self.M.m))
         self.y = np.full(2*self.n, np.inf)
 
     @cluster.on_master
     def generate_new_samples(self):
+        if self.seed_sharing:
+            self.seeds = np.random.randint(0, 2**31 - 1, self.n)
+            self.epsilon = None  # regenerated from the seeds
+            self.p[:self.n] = np.column_stack((self.seeds, np.ones(self.n)))
+            self.p[self.n:] = np.column_stack((self.seeds, -np.ones(self.n)))
+            return
         self.epsilon = self.noise()
         self.delta = self.sigma*self.epsilon
         self.p[:self.n] = self.M.p + self.delta
         self.p[self.n:] = self.M.p - self.delta
 
+    @cluster.on_master
+    def enforce_bounds_on_samples(self):
+        if not self.seed_sharing:
+            super().enforce_bounds_on_samples()
+
+    @cluster.on_master
+    def fill_parameter_array(self):
+        if not self.seed_sharing:
+            super().fill_parameter_array()
+            return
+        self.p_array[:-1] = self.p
+        self.p_array[-1] = 0.0, 0.0  # current parameters
+
+    def share_parameters(self, p=None):
+        if p is None:
+            cluster.Broadcast(self.M.p)
+        else:
+            self.M.p[:] = p  # sent with the call, no collective
+
+    def eval_seed(self, sample, x=None):
+        """Loss of the sample given by [seed, sign] row"""
+        seed, sign = int(sample[0]), sample[1]
+        if sign == 0:
+            return self.M.eval_objective(self.M.p, x)
+        p = self.M.p + sign*self.sigma*self.seed_noise(seed)
+        if self.bound_control:
+            np.clip(p, self.M.p_lb, self.M.p_ub, out=p)
+        return self.M.eval_objective(p, x)
+
+    def objective(self):
+        if self.seed_sharing:
+            return self.eval_seed
+        return super().objective()
+
+    def pool_functions(self):
+        return super().pool_functions() + (self.eval_seed, self.share_parameters)
+
+    def evaluate_samples(self, x=None):
+        if self.seed_sharing:
+            # workers perturb their copy of the current parameters, while
+            # some ranks are busy the parameters travel with the call
+            if cluster.degraded():
+                cluster.pool.everywhere(self.share_parameters, self.M.p.copy())
+            else:
+                cluster.pool.everywhere(self.share_parameters)
+        super().evaluate_samples(x)
+
     @cluster.on_master
     def grad_estimation(self):
-        y_pos = self.y[:self.n]
-        y_neg = self.y[self.n:]
-        grad = self.epsilon.transpose().dot(y_pos - y_neg)/self.n
-        return grad
+        # pairs with a failed sample do not contribute to the estimate
+        dy = self.y[:self.n] - self.y[self.n:]
+        valid = np.isfinite(dy)
+        dy[~valid] = 0.0
+        pairs = max(1, np.count_nonzero(valid))
+        if self.epsilon is None:
+            # noise is regenerated one sample at a time, memory stays O(m)
+            grad = np.zeros(self.M.m)
+            for seed, dy_seed in zip(self.seeds, dy):
+                grad += dy_seed*self.seed_noise(seed)
+            self.grad = grad/pairs
+            return self.grad
+        self.grad = self.epsilon.transpose().dot(dy)/pairs
+        return self.grad
 
     @cluster.on_master
     def update_model(self):
         self.M.p = self.M.p - self.lr*self.grad_estimation()
+
+    def gradient_norm(self):
+        if getattr(self, 'grad', None) is None:
+            return None
+        return np.linalg.norm(self.grad)
+
+    def population_diameter(self):
+        return None  # samples keep constant distance sigma from M.p
+
+    @cluster.on_master
+    def resize_population(self, n):
+        self.n = n
+        self.p = np.zeros((2*n, self.p.shape[1]))
+        self.y = np.full(2*n, np.inf)
+
+    @cluster.on_master
+    def initialize_async(self):
+        self.pairs = {}      # pair id -> [epsilon, y_pos, y_neg, p_pos, p_neg]
+        self.next_pair = 0
+        self.waiting = []    # generated samples (pair id, side) not sent yet
+        self.completed = []  # finished pairs [epsilon, y_pos, y_neg]
+
+    @cluster.on_master
+    def async_sample(self):
+        if not self.waiting:
+            # new antithetic pair around the current parameters
+            epsilon = np.random.normal(0, 1, self.M.m)
+            samples = [self.M.p + self.sigma*epsilon, self.M.p - self.sigma*epsilon]
+            if self.bound_control:
+                samples = [np.clip(p, self.M.p_lb, self.M.p_ub) for p in samples]
+            self.pairs[self.next_pair] = [epsilon, None, None] + samples
+            self.waiting = [(self.next_pair, 1), (self.next_pair, 2)]
+            self.next_pair += 1
+        j, side = self.waiting.pop(0)
+        return (j, side), self.pairs[j][side + 2]
+
+    @cluster.on_master
+    def async_result(self, key, y):
+        j, side = key
+        pair = self.pairs[j]
+        pair[side] = y
+        if pair[1] is not None and pair[2] is not None:
+            self.completed.append(self.pairs.pop(j)[:3])
+
+        # n finished pairs make one (possibly stale) gradient estimate,
+        # their noise is kept even with seed sharing (no seeds in async)
+        if len(self.completed) == self.n:
+            self.epsilon = np.array([pair[0] for pair in self.completed])
+            self.y[:self.n] = [pair[1] for pair in self.completed]
+            self.y[self.n:] = [pair[2] for pair in self.completed]
+            self.update_model()
+            self.completed = []
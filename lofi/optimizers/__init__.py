@@ -1,6 +1,9 @@
 # standard PSO with constant momentum weight 
 from .PSO import PSO
 
+# Island model PSO, one swarm per machine with periodic migration
+from .IslandPSO import IslandPSO
+
 # Greedy random adaptation PSO 
 from .GRAPSO import GRAPSO
 
@@ -12,3 +15,18 @@ from .RMSPropES import RMSPropES
 
 # Vanilla random search steping to best sample
 from .RS import RS
+
+# Covariance matrix adaptation evolution strategy
+from .CMAES import CMAES
+
+# CMA-ES with diagonal covariance (linear cost in number of parameters)
+from .SepCMAES import SepCMAES
+
+# Multi-objective genetic algorithm (non-dominated sorting and crowding)
+from .NSGA2 import NSGA2
+
+# Multi-objective PSO with leaders from the Pareto archive
+from .MOPSO import MOPSO
+
+# Pareto ranking and bounded archive of non-dominated solutions
+from .pareto import Pareto_archive, non_dominated_sort, crowding_distance
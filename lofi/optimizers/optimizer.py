@@ -1,8 +1,26 @@
 import numpy as np
+import pandas as pd
 from ..cluster import cluster
+import threading
 import time
+import os
+
+CHECKPOINT_VERSION = 1
+
+def rank_correlation(a, b):
+    """Spearman rank correlation of two samples, nan if undefined"""
+    if len(a) < 3:
+        return np.nan
+    ranks_a = np.argsort(np.argsort(a))
+    ranks_b = np.argsort(np.argsort(b))
+    if np.all(ranks_a == ranks_a[0]) or np.all(ranks_b == ranks_b[0]):
+        return np.nan
+    return np.corrcoef(ranks_a, ranks_b)[0, 1]
 
 class Optimizer():
+
+    partial_evaluation = True  # samples may be left unevaluated (inf loss)
+    scalar_loss = True         # samples are evaluated by eval_objective
     def __init__(self, M=None, bound_control=True, sparse=False, 
                  sparsity_weight=1.0):
                  
@@ -10,6 +28,17 @@ class Optimizer():
         self.bound_control = bound_control  # optional coordinate bound control
         self.sparse = sparse                # optional regularization for sparsity
         self.sparse_w = sparsity_weight     # weight of parameter density in loss
+        self.schedule = "dynamic"           # how samples are spread over ranks
+        self.cluster_stats = None           # instrumentation of the last step
+        self.surrogate = None               # optional pre-screening model
+        self.screen_fraction = 1.0          # samples passing the screening
+        self.checkpoint_file = None         # periodic checkpoints (see
+        self.checkpoint_every = 0           # set_checkpointing)
+        self.checkpoint_thread = None
+        self.stopping = {}                  # criteria of run (set_stopping)
+        self.adaptive_population = None     # see set_adaptive_population
+        self.racing = None                  # see set_racing
+        self.multi_fidelity = None          # see set_multi_fidelity
         if M is not None:
             self.connect_model(M)
             self.restart()
@@ -20,11 +49,105 @@ class Optimizer():
     def disconnect_model(self):
         self.M = None
 
+    def set_surrogate(self, surrogate=None, fraction=0.5):
+        """Surrogate (see lofi.surrogates) fitted to all evaluated samples
+        ranks new samples and only the most promising fraction of them is
+        evaluated, the others get inf loss without being simulated.
+        surrogate=None disables the screening."""
+        if surrogate is not None:
+            self.require_screening("surrogate screening")
+        self.surrogate = surrogate
+        self.screen_fraction = fraction
+
+    def require_screening(self, feature):
+        """Raises ValueError if feature cannot leave samples unevaluated or
+        rank them by partial losses in this optimizer"""
+        if not self.partial_evaluation:
+            raise ValueError(f"{self.__class__.__name__} needs losses of all "
+                             f"samples, {feature} is not supported")
+        if not self.scalar_loss:
+            raise ValueError(f"{self.__class__.__name__} evaluates vectors of "
+                             f"objectives, {feature} is not supported")
+
+    def set_checkpointing(self, filename="lofi_checkpoint.npz", every=10):
+        """Master saves a checkpoint every `every` steps, the file is
+        written by a background thread while the optimization continues.
+        filename=None disables checkpointing."""
+        self.checkpoint_file = filename
+        self.checkpoint_every = every
+
+    def set_stopping(self, stagnation=None, tol=1e-8, diameter=None,
+                     grad_norm=None, max_evals=None, max_time=None):
+        """Stopping criteria of run, checked on master after every step:
+        stagnation -> M.y did not improve by more than tol for this many steps
+        diameter   -> population (or step size) diameter fell below this
+        grad_norm  -> norm of the estimated gradient (ES) fell below this
+        max_evals  -> total number of evaluations reached
+        max_time   -> total optimization time in seconds reached
+        None disables a criterion."""
+        self.stopping = {"stagnation": stagnation, "tol": tol,
+                         "diameter": diameter, "grad_norm": grad_norm,
+                         "max_evals": max_evals, "max_time": max_time}
+
+    def set_adaptive_population(self, n_min, n_max, factor=1.5, patience=5):
+        """Population size n grows by factor (up to n_max) after patience
+        steps without improvement of M.y and shrinks by factor (down to
+        n_min) after patience steps improving it in a row."""
+        if type(self).resize_population is Optimizer.resize_population:
+            raise ValueError(f"{self.__class__.__name__} has no adaptive population")
+        self.adaptive_population = {"n_min": n_min, "n_max": n_max,
+                                    "factor": factor, "patience": patience}
+
+    def set_racing(self, rounds=3, fraction=0.5, min_survivors=2):
+        """Racing of samples over a batch of inputs (step with x): the
+        inputs are split into rounds, after every round but the last the
+        worst fraction of the remaining samples is eliminated on its partial
+        loss. Eliminated samples get inf loss, current best always runs over
+        all inputs. rounds=None disables racing."""
+        if rounds is not None:
+            self.require_screening("racing")
+        if rounds is not None and not 0.0 <= fraction < 1.0:
+            raise ValueError(f"fraction has to be in [0, 1), got {fraction}")
+        self.racing = None if rounds is None else {
+            "rounds": rounds, "fraction": fraction,
+            "min_survivors": min_survivors}
+
+    def set_multi_fidelity(self, fraction=0.25, min_promoted=2):
+        """Samples are evaluated at the fidelity levels of the model (see
+        Model_api.set_fidelity_levels) starting with the cheapest one, after
+        every level only the best fraction of them is promoted to the next.
+        Samples not reaching full fidelity get inf loss, current best always
+        reaches it. Evaluations, simulation time and rank correlation with
+        full fidelity of every level are recorded in fidelity_log. Takes
+        precedence over racing.
+        fraction=None disables multi-fidelity evaluation."""
+        if fraction is not None:
+            self.require_screening("multi-fidelity evaluation")
+        if fraction is not None and not 0.0 < fraction <= 1.0:
+            raise ValueError(f"fraction has to be in (0, 1], got {fraction}")
+        self.multi_fidelity = None if fraction is None else {
+            "fraction": fraction, "min_promoted": min_promoted}
+
+    def set_schedule(self, schedule="dynamic"):
+        """dynamic -> master feeds workers as they finish (default)
+        static  -> samples are split evenly over all ranks including master,
+                   suits objectives of homogeneous cost and single core runs"""
+        if schedule not in ("dynamic", "static"):
+            raise ValueError(f"Unknown schedule: {schedule}")
+        self.schedule = schedule
+
     def restart(self):
         self.terminate = False  # termination condition state
+        self.termination_reason = ""
+        self.stagnation_y = np.inf  # best loss seen by the stopping criteria
+        self.stagnant_steps = 0
+        self.improving_steps = 0
         self.step_time = 0.0   # time elapsed during last epoch
         self.total_time = 0.0   # total elapsed time during training
         self.iter = 0
+        self.screened = 0       # samples rejected by surrogate or racing
+        self.fidelity_log = pd.DataFrame(columns=[
+            'Iteration', 'Level', 'Evaluations', 'Time', 'Rank correlation'])
         self.initialize_state()
         self.initialize_parameter_array()
         self.results = []
@@ -48,21 +171,191 @@ class Optimizer():
         self.p_array[-1] = self.M.p # add current gbest (loss can be dynamic)
 
     def evaluate_samples(self, x=None):
-        if x is None:
-            data = cluster.sequential_map(self.M.eval_loss, self.p_array)
+        self.screened = 0  # counted again by screening, racing and promotion
+        if self.schedule == "static":
+            sequential_map = cluster.static_sequential_map
+            product_map = cluster.static_product_map
+            x = cluster.broadcast(x)  # inputs of master are the valid ones
         else:
-            data = cluster._2d_product_map(self.M.eval_loss, self.p_array, x)
-        self.results, _ = cluster.sequential_map(self.M.loss, data[0])
+            sequential_map = cluster.sequential_map
+            product_map = cluster.product_map
+
+        # only rows passing the surrogate and unknown to the cache of master
+        # are evaluated, rows of p_array have to be the parameters for that
+        # (losses of a race or of low fidelity are partial, so they bypass
+        # the cache)
+        work = self.objective()
+        rows_are_parameters = work in (self.M.eval_objective,
+                                       self.M.eval_block_objective)
+        fidelity = self.multi_fidelity is not None and \
+            len(self.M.fidelity_levels) > 0 and rows_are_parameters
+        racing = self.racing is not None and x is not None and not fidelity
+        cache = self.M.cache if cluster.global_rank == 0 else None
+        selected = None
+        if rows_are_parameters:
+            selected = self.screen_samples()
+        if racing or fidelity or not rows_are_parameters:
+            cache = None
+        p_array = self.p_array if selected is None else self.p_array[selected]
+        if cache is not None:
+            keys, losses, todo = cache.split(p_array, x)
+            evaluated = p_array[todo]
+        else:
+            evaluated = p_array
+
+        if fidelity:
+            data = self.promote_samples(product_map, evaluated, x)
+        elif x is None:
+            data = sequential_map(work, evaluated)
+        elif racing:
+            data = self.race_samples(work, product_map, evaluated, x)
+        else:
+            # loss of each candidate is summed over all inputs on the fly
+            data = product_map(work, evaluated, x,
+                               reduce=np.add, axis=1)
+        self.results = data[0]
 
         if cluster.global_rank == 0:
-            self.mean_sim_cpu_time = np.mean(np.array(data[1]))
-            self.M.y = self.results[-1]
-            self.y[:] = np.array(self.results[:-1])
+            if self.surrogate is not None and rows_are_parameters:
+                self.surrogate.add(evaluated, self.results)
+            if cache is not None:
+                self.results = cache.merge(keys, losses, todo, self.results)
+            if selected is not None:
+                results = np.full(len(self.p_array), np.inf)
+                results[selected] = self.results
+                self.results = results
+            self.resolve_results(data[1])
+
+    @cluster.on_master
+    def screen_samples(self):
+        """Indices of p_array rows worth evaluating according to the
+        surrogate (current best is always re-evaluated), None if all are"""
+        if self.surrogate is None or not self.surrogate.ready():
+            return None
+        samples = self.p_array[:-1]
+        passing = max(1, int(np.ceil(self.screen_fraction*len(samples))))
+        if passing >= len(samples):
+            return None
+        predicted = self.surrogate.predict(samples)
+        selected = np.sort(np.argsort(predicted)[:passing])
+        self.screened += len(samples) - passing
+        return np.append(selected, len(self.p_array) - 1)
+
+    def race_samples(self, work, product_map, samples, x):
+        """Evaluates samples over the inputs x in rounds (see set_racing),
+        last row of samples is the current best and is never eliminated.
+        Returns (losses, elapsed) as product_map, eliminated get inf."""
+        master = cluster.global_rank == 0
+        rounds = max(1, min(self.racing["rounds"], len(x)))
+        bounds = np.linspace(0, len(x), rounds + 1).astype(int)
+        if master:
+            losses = np.zeros(len(samples))
+            alive = np.arange(len(samples))
+            elapsed = np.zeros(0)
+        for r in range(rounds):
+            batch = x[bounds[r]:bounds[r + 1]]
+            data = product_map(work, samples[alive] if master else None,
+                               batch, reduce=np.add, axis=1)
+            if master:
+                losses[alive] += np.asarray(data[0], dtype=np.float64)
+                elapsed = np.concatenate((elapsed, np.ravel(data[1])))
+                if r < rounds - 1:
+                    alive = self.select_samples(
+                        losses, alive, 1.0 - self.racing["fraction"],
+                        self.racing["min_survivors"])
+        if not master:
+            return None, None
+        results = np.full(len(samples), np.inf)
+        results[alive] = losses[alive]
+        return results, elapsed
+
+    def promote_samples(self, product_map, samples, x):
+        """Evaluates samples level by level (see set_multi_fidelity), last
+        row of samples is the current best and is always promoted.
+        Returns (losses, elapsed) as product_map, both of full fidelity
+        (times of all levels are in fidelity_log)."""
+        master = cluster.global_rank == 0
+        work = self.M.eval_fidelity_objective
+        levels = len(self.M.fidelity_levels) + 1
+        if master:
+            losses = np.full((levels, len(samples)), np.nan)
+            elapsed = []
+            alive = np.arange(len(samples))
+        for level in range(levels):
+            # loss of each sample is summed over all inputs on the fly
+            axes = (samples[alive] if master else None, np.array([level]))
+            if x is not None:
+                axes += (x,)
+            data = product_map(work, *axes, reduce=np.add,
+                               axis=tuple(range(1, len(axes))))
+            if master:
+                losses[level, alive] = np.asarray(data[0], dtype=np.float64)
+                elapsed.append(np.ravel(data[1]))
+                if level < levels - 1:
+                    alive = self.select_samples(
+                        losses[level], alive, self.multi_fidelity["fraction"],
+                        self.multi_fidelity["min_promoted"])
+        if not master:
+            return None, None
+        self.record_fidelity(losses, elapsed)
+        results = np.where(np.isnan(losses[-1]), np.inf, losses[-1])
+        return results, elapsed[-1]
+
+    @cluster.on_master
+    def record_fidelity(self, losses, elapsed):
+        """Appends cost and accuracy of the levels in this step to fidelity_log"""
+        full = losses[-1]
+        for level, (level_losses, times) in enumerate(zip(losses, elapsed)):
+            both = np.isfinite(level_losses) & np.isfinite(full)
+            self.fidelity_log.loc[len(self.fidelity_log)] = [
+                self.iter, level, len(times), np.nansum(times),
+                rank_correlation(level_losses[both], full[both])]
 
-            # count succesfully completed evaluations
-            total = len(self.y)
-            self.failed = np.count_nonzero(self.y == np.inf)
-            self.survived = total - self.failed
+    @cluster.on_master
+    def fidelity_summary(self):
+        """Mean simulation time per evaluation and mean rank correlation
+        with full fidelity of every level over the recorded steps"""
+        log = self.fidelity_log.astype(np.float64)
+        summary = log.groupby('Level').agg(
+            {'Evaluations': 'sum', 'Time': 'sum', 'Rank correlation': 'mean'})
+        summary['Time per evaluation'] = summary['Time']/summary['Evaluations']
+        return summary
+
+    @cluster.on_master
+    def select_samples(self, losses, alive, fraction, minimum):
+        """Indices of the best fraction (at least minimum) of alive samples,
+        the last sample (current best) is always selected. Dropped samples
+        are screened unless they already failed."""
+        kept = max(int(np.ceil(len(alive)*fraction)), minimum)
+        survivors = alive[np.argsort(losses[alive], kind="stable")[:kept]]
+        best = len(losses) - 1
+        if best in alive and best not in survivors:
+            survivors = np.append(survivors, best)
+        dropped = np.setdiff1d(alive, survivors)
+        self.screened += np.count_nonzero(np.isfinite(losses[dropped]))
+        return np.sort(survivors)
+
+    @cluster.on_master
+    def resolve_results(self, elapsed):
+        """Assigns losses of the evaluated p_array (self.results), samples
+        left out by screening, racing or promotion count neither as success
+        nor as failure"""
+        elapsed = np.array(elapsed, dtype=np.float64)
+        self.mean_sim_cpu_time = np.mean(elapsed) if elapsed.size else 0.0
+        self.M.y = self.results[-1]
+        self.y[:] = np.array(self.results[:-1])
+
+        # count succesfully completed evaluations
+        total = len(self.y) - self.screened
+        self.failed = np.count_nonzero(self.y == np.inf) - self.screened
+        self.survived = total - self.failed
+
+    def objective(self):
+        """Function evaluating a row of p_array (and an input x) on workers,
+        vectorized models get blocks of rows"""
+        if self.M.vectorized:
+            return self.M.eval_block_objective
+        return self.M.eval_objective
 
     @cluster.on_master
     def resolve_map_elapsed(self,):
@@ -73,8 +366,38 @@ class Optimizer():
         """This method calculates and assigns newest model parameters"""
         pass
 
+    @cluster.on_master
+    def initialize_async(self):
+        """This function prepares the algorithm state for run_async"""
+        raise NotImplementedError(f"{self.__class__.__name__} has no asynchronous mode")
+
+    @cluster.on_master
+    def async_sample(self):
+        """Returns (key, parameters) of a new sample or None if the algorithm
+        has to wait for some results first"""
+        pass
+
+    @cluster.on_master
+    def async_result(self, key, y):
+        """Consumes loss y of sample key as soon as it arrives"""
+        pass
+
+    @cluster.on_master
+    def async_epoch(self):
+        """This method is called after every len(self.y) results of run_async"""
+        pass
+
     def update_log(self):
-        self.M.update_log()
+        if cluster.degraded():
+            self.M.update_log()  # no collectives while some ranks are busy
+        else:
+            cluster.pool.everywhere(self.M.update_log)
+
+    def update_cluster_stats(self):
+        """Traffic and timing of the cluster since the last call (only with
+        cluster.options.set_instrumentation), Cluster_stats on master"""
+        if cluster.options.instrumentation and not cluster.degraded():
+            self.cluster_stats = cluster.pool.everywhere(cluster.gather_stats)
 
     @cluster.on_master
     def enforce_bounds_on_samples(self):
@@ -108,17 +431,317 @@ class Optimizer():
 """
        print(tbl)
 
+    def pool_functions(self):
+        """Functions the resident workers execute during step"""
+        return (self.M.eval_objective, self.M.eval_batch_objective,
+                self.M.eval_block_objective, self.M.eval_fidelity_objective,
+                self.M.update_log, cluster.gather_stats)
+
     def step(self, x=None, n=1):
-        for i in range(n):
-            step_timer = cluster.Timer()
+        """Performs n steps while workers stay resident in cluster.pool.
+        On workers this call only serves the master until the steps end.
+        With static schedule all ranks perform the steps together."""
+        if self.schedule == "static":
+            for i in range(n):
+                self.single_step(x)
+            return
+        if not cluster.pool.start(*self.pool_functions()):
+            return
+        try:
+            for i in range(n):
+                self.single_step(x)
+        finally:
+            cluster.pool.stop()
+
+    def run_async(self, evaluations, x=None):
+        """Steady-state optimization with a budget of evaluations.
+        Every returning result updates the algorithm state immediately and
+        the freed worker gets a freshly generated sample, so slow simulations
+        do not idle the other workers. Current best parameters are
+        re-evaluated once per epoch (every len(self.y) results).
+        x is a batch of inputs (as in step) evaluated within a single task."""
+        if not cluster.pool.start(*self.pool_functions()):
+            return
+        try:
+            self.async_loop(evaluations, x)
+            self.update_log()
+            self.update_cluster_stats()
+            self.update_console_table()
+        finally:
+            cluster.pool.stop()
+
+    def async_loop(self, evaluations, x=None):
+        run_timer = cluster.Timer()
+        epoch_timer = cluster.Timer()
+        self.initialize_async()
+        self.async_count = 0
+        self.elapsed_sum = 0.0
+        self.survived = 0
+        self.failed = 0
+        evals = getattr(self.M, 'total_evals', 0)
+        self.best_due = True  # current best goes out with the next sample
+
+        def source():
+            if self.best_due:
+                self.best_due = False
+                self.best_sample = self.M.p.copy()
+                key, p = "best", self.best_sample
+            else:
+                sample = self.async_sample()
+                if sample is None:
+                    return None
+                key, p = sample
+            return key, (p,) if x is None else (p, x), {}
+
+        def sink(key, y, elapsed):
+            if key == "best":
+                # previous (p, y) is the incumbent until its re-evaluation
+                # returns, loss can be dynamic so it is updated if best did
+                # not move meanwhile
+                if np.array_equal(self.best_sample, self.M.p):
+                    self.M.y = y
+            else:
+                self.async_result(key, y)
+                if y == np.inf:
+                    self.failed += 1
+                else:
+                    self.survived += 1
+            self.async_count += 1
+            self.elapsed_sum += elapsed
+            if self.async_count % len(self.y) == 0:
+                self.async_epoch()
+                self.best_due = True
+                self.update_iteration_counter()
+                self.step_time = epoch_timer.get_lap()
+                self.M.total_evals = evals + self.async_count  # no collectives now
+                self.mean_sim_cpu_time = self.elapsed_sum/self.async_count
+                self.update_console_table()
+
+        work = self.M.eval_objective if x is None else self.M.eval_batch_objective
+        data = cluster.async_map(work, source, sink, evaluations)
+        self.mean_sim_cpu_time = np.mean(data[1])
+        self.total_time += run_timer.get_elapsed()
+
+    # attributes that are configuration, references or derived data
+    checkpoint_exclude = ('M', 'p_array', 'results', 'surrogate',
+                          'fidelity_log', 'cluster_stats', 'checkpoint_file',
+                          'checkpoint_every', 'checkpoint_thread')
+
+    @cluster.on_master
+    def get_checkpoint(self):
+        """Copy of the state as a dict of arrays: arrays and scalars of the
+        optimizer, current best of the model, its log and the RNG state"""
+        state = {"version": np.array(CHECKPOINT_VERSION),
+                 "algorithm": np.array(self.__class__.__name__)}
+        for name, value in vars(self).items():
+            if name in self.checkpoint_exclude:
+                continue
+            if isinstance(value, np.ndarray) and value.dtype != object:
+                state["array/" + name] = value.copy()
+            elif isinstance(value, (bool, int, float, str, np.number, np.bool_)):
+                state["scalar/" + name] = np.array(value)
+        state["model/p"] = np.array(self.M.p, dtype=np.float64)
+        state["model/y"] = np.array(self.M.y, dtype=np.float64)
+        state["model/total_evals"] = np.array(getattr(self.M, 'total_evals', 0))
+        for column in self.M.log.columns:
+            state["log/" + column] = self.M.log[column].to_numpy(dtype=np.float64)
+        algorithm, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        state["rng/keys"] = keys
+        state["rng/state"] = np.array([pos, has_gauss], dtype=np.int64)
+        state["rng/cached_gaussian"] = np.array(cached_gaussian)
+        return state
+
+    @cluster.on_master
+    def restore_checkpoint(self, state):
+        """Restores entries a subclass added to get_checkpoint"""
+        pass
+
+    @cluster.on_master
+    def write_checkpoint(self, state, filename):
+        # write to temporary file first, so a crash never leaves a broken one
+        temporary = filename + ".tmp.npz"
+        np.savez(temporary, **state)
+        os.replace(temporary, filename)
+
+    @cluster.on_master
+    def save_checkpoint(self, filename="lofi_checkpoint.npz", background=False):
+        """Saves the state of the optimization into .npz file, with
+        background=True the file is written by a background thread"""
+        self.wait_for_checkpoint()
+        state = self.get_checkpoint()
+        if not background:
+            self.write_checkpoint(state, filename)
+            return
+        self.checkpoint_thread = threading.Thread(
+            target=self.write_checkpoint, args=(state, filename))
+        self.checkpoint_thread.start()
+
+    @cluster.on_master
+    def wait_for_checkpoint(self):
+        if self.checkpoint_thread is not None:
+            self.checkpoint_thread.join()
+            self.checkpoint_thread = None
+
+    def load_checkpoint(self, filename="lofi_checkpoint.npz"):
+        """Restores the state saved by save_checkpoint, must be called on
+        all ranks (the rank count may differ from the saved run)"""
+        if cluster.global_rank == 0:
+            with np.load(filename) as data:
+                state = dict(data)
+            if int(state["version"]) != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version {int(state['version'])}")
+            if str(state["algorithm"]) != self.__class__.__name__:
+                raise ValueError(f"Checkpoint of {state['algorithm']} cannot be "
+                                 f"loaded by {self.__class__.__name__}")
+            for key, value in state.items():
+                kind, name = key.split("/", 1) if "/" in key else (None, key)
+                if kind == "array":
+                    setattr(self, name, value)
+                elif kind == "scalar":
+                    setattr(self, name, value.item())
+            self.M.p = state["model/p"]
+            self.M.y = float(state["model/y"])
+            self.M.log = pd.DataFrame({key[4:]: value for key, value in state.items()
+                                       if key.startswith("log/")})
+            np.random.set_state(("MT19937", state["rng/keys"],
+                                 int(state["rng/state"][0]),
+                                 int(state["rng/state"][1]),
+                                 float(state["rng/cached_gaussian"])))
+            self.restore_checkpoint(state)
+            total_evals = int(state["model/total_evals"])
+            others = cluster.sum_all(0)
+        else:
+            others = cluster.sum_all(self.M.evals)
+
+        # evaluation counter continues from the saved total
+        if cluster.global_rank == 0:
+            self.M.evals = total_evals - others
+            self.M.total_evals = total_evals
+        cluster.Broadcast(self.M.p)
+        self.M.y = cluster.broadcast(self.M.y)
+        self.initialize_parameter_array()
+
+    def population_diameter(self):
+        """Largest extent of the samples over the coordinates"""
+        if self.p is None or np.ndim(self.p) != 2:
+            return None
+        return np.ptp(self.p, axis=0).max()
+
+    def gradient_norm(self):
+        """Norm of the last gradient estimate, None if not applicable"""
+        return None
+
+    def resize_population(self, n):
+        """Changes population size to n keeping the algorithm state"""
+        raise NotImplementedError(f"{self.__class__.__name__} has no adaptive population")
+
+    @cluster.on_master
+    def update_stagnation(self):
+        tol = self.stopping.get("tol", 1e-8)
+        if self.M.y < self.stagnation_y - tol:
+            self.stagnant_steps = 0
+            self.improving_steps += 1
+        else:
+            self.stagnant_steps += 1
+            self.improving_steps = 0
+        self.stagnation_y = min(self.stagnation_y, self.M.y)
+
+    @cluster.on_master
+    def check_termination(self):
+        criteria = self.stopping
+        below = lambda value, limit: value is not None and value < limit
+        if criteria.get("stagnation") is not None and \
+                self.stagnant_steps >= criteria["stagnation"]:
+            self.termination_reason = "stagnation"
+        elif criteria.get("diameter") is not None and \
+                below(self.population_diameter(), criteria["diameter"]):
+            self.termination_reason = "diameter"
+        elif criteria.get("grad_norm") is not None and \
+                below(self.gradient_norm(), criteria["grad_norm"]):
+            self.termination_reason = "grad_norm"
+        elif criteria.get("max_evals") is not None and \
+                getattr(self.M, 'total_evals', 0) >= criteria["max_evals"]:
+            self.termination_reason = "max_evals"
+        elif criteria.get("max_time") is not None and \
+                self.total_time >= criteria["max_time"]:
+            self.termination_reason = "max_time"
+        self.terminate = bool(self.termination_reason)
+
+    @cluster.on_master
+    def adapt_population(self):
+        settings = self.adaptive_population
+        if settings is None:
+            return
+        n = self.n
+        if self.stagnant_steps >= settings["patience"]:
+            n = min(settings["n_max"], int(np.ceil(n*settings["factor"])))
+        elif self.improving_steps >= settings["patience"]:
+            n = max(settings["n_min"], int(n/settings["factor"]))
+        if n != self.n:
+            self.resize_population(n)
+            self.initialize_parameter_array()
+            self.stagnant_steps = 0
+            self.improving_steps = 0
+
+    def run(self, x=None, max_steps=None):
+        """Performs steps until a stopping criterion (see set_stopping) is
+        met or max_steps were done, workers stay resident meanwhile.
+        Must be called on all ranks, reason is in termination_reason."""
+        self.start_run(max_steps)
+        if self.schedule == "static":
+            self.run_spmd(x, max_steps)
+            return
+        if not cluster.pool.start(*self.pool_functions()):
+            return
+        steps = 0
+        try:
+            while not self.terminate and (max_steps is None or steps < max_steps):
+                self.single_step(x)
+                steps += 1
+        finally:
+            cluster.pool.stop()
+
+    def start_run(self, max_steps):
+        criteria = [value for key, value in self.stopping.items() if key != "tol"]
+        if max_steps is None and all(value is None for value in criteria):
+            raise ValueError("run needs max_steps or stopping criteria (see set_stopping)")
+        self.terminate = False
+        self.termination_reason = ""
+
+    def run_spmd(self, x, max_steps):
+        """All ranks step together, decision of master to stop is broadcast"""
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            self.single_step(x)
+            steps += 1
+            if cluster.broadcast(self.terminate):
+                break
+
+    @cluster.on_master
+    def checkpoint_if_due(self):
+        if self.checkpoint_file is not None and self.checkpoint_every and \
+                self.iter % self.checkpoint_every == 0:
+            self.save_checkpoint(self.checkpoint_file, background=True)
+
+    def single_step(self, x=None):
+        step_timer = cluster.Timer()
+        with cluster.Span("generate_new_samples", "optimizer"):
             self.generate_new_samples()
             self.enforce_bounds_on_samples()
             self.fill_parameter_array()
+        with cluster.Span("evaluate_samples", "optimizer"):
             self.evaluate_samples(x)
+        with cluster.Span("update_model", "optimizer"):
             self.update_model()
 
-            self.update_iteration_counter()
+        self.update_iteration_counter()
+        with cluster.Span("update_log", "optimizer"):
             self.update_log()
-            self.update_console_table()
-            self.step_time = step_timer.get_elapsed()
-            self.total_time += self.step_time
+        self.update_cluster_stats()
+        self.update_console_table()
+        self.step_time = step_timer.get_elapsed()
+        self.total_time += self.step_time
+        self.update_stagnation()
+        self.check_termination()
+        self.adapt_population()
+        self.checkpoint_if_due()
@@ -0,0 +1,206 @@
+from .optimizer import Optimizer, cluster, np
+import pandas as pd
+
+def dominance_matrix(F):
+    """Boolean (n, n) matrix D of rows of objectives F (minimized),
+    D[i, j] is True if row i dominates row j"""
+    n = len(F)
+    not_worse = np.ones((n, n), dtype=bool)
+    better = np.zeros((n, n), dtype=bool)
+    for f in F.T:  # one objective at a time keeps the memory at n*n
+        not_worse &= f[:, None] <= f[None, :]
+        better |= f[:, None] < f[None, :]
+    return not_worse & better
+
+def non_dominated(F):
+    """Mask of the rows of F not dominated by any other row"""
+    F = np.nan_to_num(np.asarray(F, dtype=np.float64), nan=np.inf)
+    return ~dominance_matrix(F).any(axis=0)
+
+def non_dominated_sort(F):
+    """Index of the Pareto front of every row of F (0 is non-dominated),
+    fronts are peeled off the dominance matrix without python loops over
+    the rows"""
+    F = np.nan_to_num(np.asarray(F, dtype=np.float64), nan=np.inf)
+    dominates = dominance_matrix(F)
+    count = dominates.sum(axis=0)  # number of rows dominating each row
+    rank = np.full(len(F), -1)
+    front = np.flatnonzero(count == 0)
+    r = 0
+    while front.size:
+        rank[front] = r
+        count -= dominates[front].sum(axis=0)
+        count[front] = -1
+        front = np.flatnonzero(count == 0)
+        r += 1
+    return rank
+
+def crowding_distance(F, rank=None):
+    """Crowding distance of every row of F within its front (all rows are
+    one front if rank is None), boundary rows of a front get inf"""
+    F = np.nan_to_num(np.asarray(F, dtype=np.float64), nan=np.inf)
+    n, k = F.shape
+    rank = np.zeros(n, dtype=int) if rank is None else np.asarray(rank)
+    distance = np.zeros(n)
+    if n == 0:
+        return distance
+    for j in range(k):
+        # rows sorted by front, then by the objective within the front
+        order = np.lexsort((F[:, j], rank))
+        values, fronts = F[order, j], rank[order]
+        change = fronts[1:] != fronts[:-1]
+        first = np.concatenate(([True], change))
+        last = np.concatenate((change, [True]))
+        starts, ends = np.flatnonzero(first), np.flatnonzero(last)
+        span = np.repeat(values[ends] - values[starts], ends - starts + 1)
+        gap = np.zeros(n)
+        gap[1:-1] = values[2:] - values[:-2]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            d = gap/span
+        d[~np.isfinite(d)] = 0.0
+        d[first | last] = np.inf
+        distance[order] += d
+    return distance
+
+class Pareto_archive():
+    """Bounded set of mutually non-dominated (parameters, objectives) pairs.
+    If it grows over size, members of the most crowded regions are dropped.
+    Failed (non-finite) evaluations never enter the archive."""
+    def __init__(self, size=1000):
+        self.size = size
+        self.P = None  # parameters of the members
+        self.F = None  # objectives of the members
+
+    def __len__(self):
+        return 0 if self.P is None else len(self.P)
+
+    def add(self, P, F):
+        P = np.atleast_2d(np.asarray(P, dtype=np.float64))
+        F = np.atleast_2d(np.asarray(F, dtype=np.float64))
+        finite = np.all(np.isfinite(F), axis=1)
+        P, F = P[finite], F[finite]
+        if self.P is not None:
+            P, F = np.vstack((self.P, P)), np.vstack((self.F, F))
+        if not len(P):
+            return
+        P, unique = np.unique(P, axis=0, return_index=True)
+        F = F[unique]
+        front = non_dominated(F)
+        P, F = P[front], F[front]
+        if len(P) > self.size:
+            kept = np.argsort(-crowding_distance(F), kind="stable")[:self.size]
+            P, F = P[kept], F[kept]
+        self.P, self.F = P, F
+
+    def to_frame(self, p_names=None, f_names=None):
+        """Members as pandas DataFrame, parameters followed by objectives"""
+        if self.P is None:
+            return pd.DataFrame(columns=list(p_names or []) + list(f_names or []))
+        p_names = p_names or [f"p{i}" for i in range(self.P.shape[1])]
+        f_names = f_names or [f"f{i}" for i in range(self.F.shape[1])]
+        return pd.concat((pd.DataFrame(self.P, columns=p_names),
+                          pd.DataFrame(self.F, columns=f_names)), axis=1)
+
+    def save(self, filename="pareto_archive.csv", p_names=None, f_names=None):
+        """Exports the members into .csv file"""
+        self.to_frame(p_names, f_names).to_csv(filename, index=False)
+
+class Multi_objective(Optimizer):
+    """Base of multi-objective optimizers. Samples are evaluated by
+    M.eval_objectives, so the loss of every output is kept (self.F) instead
+    of their sum, non-dominated samples are collected in a bounded Pareto
+    archive. M.p and M.y follow the sample with the lowest sum of the
+    objectives (the loss of single objective optimizers). Surrogate
+    screening, racing, multi-fidelity and the evaluation cache of the model
+    work with scalar losses only, so they are refused."""
+
+    scalar_loss = False
+    def __init__(self, M=None, archive_size=1000, bound_control=True,
+                 sparse=False, sparsity_weight=1.0):
+
+        self.archive_size = archive_size
+
+        super().__init__(M=M, bound_control=bound_control, sparse=sparse,
+                         sparsity_weight=sparsity_weight)
+
+    def restart(self):
+        self.archive = Pareto_archive(self.archive_size)
+        self.F = None  # objectives of the population
+        super().restart()
+
+    def objective(self):
+        return self.M.eval_objectives
+
+    def pool_functions(self):
+        return super().pool_functions() + (self.M.eval_objectives,)
+
+    def evaluate_samples(self, x=None):
+        if self.M.cache is not None:
+            raise ValueError(f"{self.__class__.__name__} evaluates vectors of "
+                             f"objectives, evaluation cache is not supported")
+        if self.schedule == "static":
+            sequential_map = cluster.static_sequential_map
+            product_map = cluster.static_product_map
+            x = cluster.broadcast(x)  # inputs of master are the valid ones
+        else:
+            sequential_map = cluster.sequential_map
+            product_map = cluster.product_map
+
+        # vectors of objectives are summed over the inputs on master
+        if x is None:
+            data = sequential_map(self.M.eval_objectives, self.p_array)
+        else:
+            data = product_map(self.M.eval_objectives, self.p_array, x)
+        self.results = data[0]
+        self.resolve_results(data[1])
+
+    @cluster.on_master
+    def stack_objectives(self, results):
+        """(rows, objectives) array of the results of evaluate_samples,
+        failed evaluations ([inf]) are spread over all objectives"""
+        rows = len(results)
+        items = results.ravel() if isinstance(results, np.ndarray) else results
+        vectors = [np.atleast_1d(np.asarray(item, dtype=np.float64)) for item in items]
+        k = max(len(vector) for vector in vectors)
+        F = np.array([np.broadcast_to(vector, (k,)) for vector in vectors])
+        return F.reshape(rows, -1, k).sum(axis=1)
+
+    @cluster.on_master
+    def resolve_results(self, elapsed):
+        F = self.stack_objectives(self.results)
+        self.F = F[:-1]
+        self.results = F.sum(axis=1)
+        super().resolve_results(elapsed)
+
+    @cluster.on_master
+    def update_archive(self):
+        self.archive.add(self.p, self.F)
+        best_idx = np.argmin(self.y)
+        if self.M.y > self.y[best_idx]:
+            self.M.p = self.p[best_idx].copy()
+            self.M.y = self.y[best_idx]
+
+    @cluster.on_master
+    def get_checkpoint(self):
+        state = super().get_checkpoint()
+        if len(self.archive):
+            state["archive/P"] = self.archive.P.copy()
+            state["archive/F"] = self.archive.F.copy()
+        return state
+
+    @cluster.on_master
+    def restore_checkpoint(self, state):
+        self.archive = Pareto_archive(self.archive_size)
+        if "archive/P" in state:
+            self.archive.P = state["archive/P"]
+            self.archive.F = state["archive/F"]
+
+    @cluster.on_master
+    def save_archive(self, filename="pareto_archive.csv"):
+        """Exports the Pareto archive with names of parameters and outputs"""
+        p_names = getattr(self.M, 'p_names', None)
+        f_names = self.M.y_names
+        if not f_names or self.archive.F is None or \
+                len(f_names) != self.archive.F.shape[1]:
+            f_names = None
+        self.archive.save(filename, p_names, f_names)
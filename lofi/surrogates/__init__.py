@@ -0,0 +1 @@
+from .surrogates import Surrogate, RBF, GP
@@ -0,0 +1,117 @@
+import numpy as np
+
+class Surrogate():
+    """Cheap model of the loss fitted to an archive of evaluated (p, y)
+    pairs. The archive keeps the size most recent finite pairs (the loss can
+    be dynamic) and the model is refitted whenever new pairs arrive.
+    Parameters are standardized by the archive before fitting."""
+    def __init__(self, size=500):
+        self.size = size
+        self.P = None
+        self.y = None
+
+    def add(self, P, y):
+        P = np.atleast_2d(np.asarray(P, dtype=np.float64))
+        y = np.asarray(y, dtype=np.float64).reshape(-1)
+        finite = np.isfinite(y)
+        if not np.any(finite):
+            return
+        if self.P is None:
+            self.P, self.y = P[finite], y[finite]
+        else:
+            self.P = np.vstack((self.P, P[finite]))[-self.size:]
+            self.y = np.concatenate((self.y, y[finite]))[-self.size:]
+        self.mean = self.P.mean(axis=0)
+        self.scale = np.maximum(self.P.std(axis=0), 1e-12)
+        if self.ready():
+            self.fit()
+
+    def ready(self):
+        """Enough points to fit a model with linear trend"""
+        return self.P is not None and len(self.P) >= self.P.shape[1] + 2
+
+    def standardize(self, P):
+        return (np.atleast_2d(P) - self.mean)/self.scale
+
+    def fit(self):
+        pass
+
+    def predict(self, P):
+        """Predicted losses of rows of P (lower is more promising)"""
+        pass
+
+def squared_distances(A, B):
+    d = np.sum(A**2, axis=1)[:, None] + np.sum(B**2, axis=1)[None, :] - 2*A.dot(B.T)
+    return np.maximum(d, 0.0)
+
+class RBF(Surrogate):
+    """Cubic radial basis function interpolation with linear tail"""
+    def __init__(self, size=500, smoothing=1e-8):
+        super().__init__(size)
+        self.smoothing = smoothing
+
+    def fit(self):
+        X = self.standardize(self.P)
+        n, m = X.shape
+        Phi = np.sqrt(squared_distances(X, X))**3
+        Phi[np.diag_indices(n)] += self.smoothing
+        tail = np.hstack((np.ones((n, 1)), X))
+        A = np.zeros((n + m + 1, n + m + 1))
+        A[:n, :n] = Phi
+        A[:n, n:] = tail
+        A[n:, :n] = tail.T
+        b = np.concatenate((self.y, np.zeros(m + 1)))
+        try:
+            coefficients = np.linalg.solve(A, b)
+        except np.linalg.LinAlgError:
+            coefficients = np.linalg.lstsq(A, b, rcond=None)[0]
+        self.weights = coefficients[:n]
+        self.trend = coefficients[n:]
+
+    def predict(self, P):
+        X = self.standardize(P)
+        Phi = np.sqrt(squared_distances(X, self.standardize(self.P)))**3
+        return Phi.dot(self.weights) + self.trend[0] + X.dot(self.trend[1:])
+
+class GP(Surrogate):
+    """Gaussian process regression with squared exponential kernel. Length
+    scale defaults to the median distance of the archive. Prediction is the
+    lower confidence bound mean - kappa*std, so uncertain regions are not
+    screened out too early (kappa=0 ranks by the mean only)."""
+    def __init__(self, size=300, kappa=1.0, noise=1e-6, length_scale=None):
+        super().__init__(size)
+        self.kappa = kappa
+        self.noise = noise
+        self.length_scale = length_scale
+
+    def kernel(self, A, B):
+        return np.exp(-0.5*squared_distances(A, B)/self.length**2)
+
+    def fit(self):
+        X = self.standardize(self.P)
+        D = squared_distances(X, X)
+        if self.length_scale is None:
+            self.length = np.sqrt(np.median(D[np.triu_indices(len(X), 1)]))
+            self.length = max(self.length, 1e-6)
+        else:
+            self.length = self.length_scale
+        self.y_mean = self.y.mean()
+        self.y_scale = max(self.y.std(), 1e-12)
+        K = np.exp(-0.5*D/self.length**2)
+        K[np.diag_indices(len(X))] += self.noise
+        try:
+            self.L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            # (nearly) duplicate points, more jitter
+            K[np.diag_indices(len(X))] += 1e-4
+            self.L = np.linalg.cholesky(K)
+        target = (self.y - self.y_mean)/self.y_scale
+        self.alpha = np.linalg.solve(self.L.T, np.linalg.solve(self.L, target))
+
+    def predict(self, P):
+        X = self.standardize(P)
+        K = self.kernel(X, self.standardize(self.P))
+        mean = K.dot(self.alpha)
+        v = np.linalg.solve(self.L, K.T)
+        std = np.sqrt(np.maximum(1.0 - np.sum(v**2, axis=0), 0.0))
+        return self.y_mean + self.y_scale*(mean - self.kappa*std)
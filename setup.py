@@ -18,8 +18,9 @@ setup(
         'numpy>=1.19.2',
         'pandas>=1.2.3',
         'DyMat>=0.7',
-        'mpi4py>=3.0.3',
         'matplotlib>=3.1.0'],
+    extras_require={
+        'mpi': ['mpi4py>=3.0.3']},
     packages = find_packages(),
     keywords = 'optimization, Open Modelica, MPI',
     python_requires='>3.6.0',
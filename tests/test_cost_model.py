@@ -0,0 +1,21 @@
+import numpy as np
+
+from lofi.cluster import cluster
+
+def test_inputs_with_equal_repr_have_own_costs():
+    a = np.zeros(2000)
+    b = a.copy()
+    b[1000] = 1.0  # repr abbreviates the middle of long arrays
+    assert repr(a) == repr(b)
+    model = cluster.Cost_model()
+    model.update(model.key(a), 1.0)
+    model.update(model.key(b), 5.0)
+    assert model.predict([model.key(a), model.key(b)]).tolist() == [1.0, 5.0]
+    assert model.order([model.key(a), model.key(b)]).tolist() == [1, 0]
+
+def test_keys_distinguish_dtype_and_shape():
+    x = np.arange(6.0)
+    keys = {cluster.input_key(x), cluster.input_key(x.reshape(2, 3)),
+            cluster.input_key(x.astype(np.float32)), cluster.input_key(list(x))}
+    assert len(keys) == 4
+    assert cluster.input_key(x) == cluster.input_key(x.copy())
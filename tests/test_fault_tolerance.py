@@ -0,0 +1,103 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("mpi4py")
+MPIRUN = shutil.which("mpirun")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys, time
+import numpy as np
+import lofi
+from lofi.cluster import cluster
+
+algorithm, policy, armed = sys.argv[1], sys.argv[2], [False]
+
+def f(x, p):
+    if armed[0] and cluster.global_rank == 2:
+        time.sleep(3600)  # permanently stuck worker
+    return float(np.sum((p - 0.3)**2))
+
+if policy == "timeout":
+    cluster.options.set_fault_tolerance(timeout=0.5)
+else:
+    cluster.options.set_straggler_policy(factor=3, abandon_factor=20)
+cluster.options.set_instrumentation()
+model = lofi.APIs.py_function(f, p_start=[3.0]*4, p_lb=[-5]*4, p_ub=[5]*4)
+kwargs = {"seed_sharing": True} if algorithm == "VanillaES" else {}
+opt = getattr(lofi.optimizers, algorithm)(model, **kwargs)
+armed[0] = sys.argv[3] == "hang"
+start = time.time()
+failed = 0
+for i in range(3):
+    opt.step()
+    failed += opt.failed if cluster.global_rank == 0 else 0
+if cluster.global_rank == 0:
+    print("RESULT", time.time() - start, model.total_evals, opt.iter, failed,
+          flush=True)
+    cluster.comm.Abort(0)  # stuck rank would never leave
+"""
+
+INTERRUPTED = """
+import time
+import numpy as np
+import lofi
+from lofi.cluster import cluster
+
+def f(x, p):
+    time.sleep(0.02)
+    return float(np.sum(p**2))
+
+model = lofi.APIs.py_function(f, p_start=[0.5]*3, p_lb=[-1]*3, p_ub=[1]*3)
+opt = lofi.optimizers.PSO(model, n=10)
+if cluster.global_rank == 0:
+    def failing(i, y):
+        raise RuntimeError("failing sink")
+    opt.async_result = failing
+try:
+    opt.run_async(20)  # master raises while tasks are in flight
+except RuntimeError:
+    pass
+opt.step()
+if cluster.global_rank == 0:
+    wrong = np.count_nonzero(~np.isclose(opt.y, np.sum(opt.p**2, axis=1)))
+    print("RESULT", wrong, len(cluster.pool.functions), flush=True)
+"""
+
+def run_script(tmp_path, *args, source=SCRIPT):
+    script = tmp_path / "hang.py"
+    script.write_text(source)
+    path = os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH"))))
+    env = dict(os.environ, PYTHONPATH=path,
+               OMPI_ALLOW_RUN_AS_ROOT="1", OMPI_ALLOW_RUN_AS_ROOT_CONFIRM="1",
+               OMPI_MCA_rmaps_base_oversubscribe="1")
+    process = subprocess.run([MPIRUN, "-n", "3", sys.executable, str(script), *args],
+                             capture_output=True, text=True, env=env, timeout=120)
+    lines = [line for line in process.stdout.splitlines() if line.startswith("RESULT")]
+    assert lines, process.stdout + process.stderr
+    return [float(value) for value in lines[0].split()[1:]]
+
+@pytest.mark.skipif(MPIRUN is None, reason="mpirun is not available")
+@pytest.mark.parametrize("policy", ["timeout", "abandon"])
+@pytest.mark.parametrize("algorithm", ["PSO", "VanillaES"])
+def test_steps_continue_without_hung_worker(tmp_path, algorithm, policy):
+    elapsed, total_evals, steps, failed = run_script(tmp_path, algorithm, policy, "hang")
+    assert elapsed < 10.0  # no collective waited for the stuck rank
+    assert steps == 3
+    assert total_evals > 0
+
+@pytest.mark.skipif(MPIRUN is None, reason="mpirun is not available")
+def test_cheap_evaluations_are_not_abandoned(tmp_path):
+    elapsed, total_evals, steps, failed = run_script(tmp_path, "PSO", "abandon", "healthy")
+    assert steps == 3
+    assert failed == 0
+
+@pytest.mark.skipif(MPIRUN is None, reason="mpirun is not available")
+def test_results_of_interrupted_map_are_dropped(tmp_path):
+    wrong, registered = run_script(tmp_path, source=INTERRUPTED)
+    assert wrong == 0  # losses belong to the evaluated positions
+    assert registered == 0  # stopped pool keeps no work functions
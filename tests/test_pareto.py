@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import lofi
+from lofi.optimizers.pareto import (Pareto_archive, crowding_distance,
+                                    non_dominated, non_dominated_sort)
+
+def brute_force_sort(F):
+    F = np.nan_to_num(np.asarray(F, dtype=np.float64), nan=np.inf)
+    dominates = lambda a, b: np.all(a <= b) and np.any(a < b)
+    rank = np.full(len(F), -1)
+    remaining = set(range(len(F)))
+    r = 0
+    while remaining:
+        front = [i for i in remaining
+                 if not any(dominates(F[j], F[i]) for j in remaining)]
+        rank[front] = r
+        remaining -= set(front)
+        r += 1
+    return rank
+
+def test_non_dominated_sort():
+    F = np.array([[1, 4], [2, 3], [3, 3], [4, 1], [4, 4], [np.nan, 0]])
+    assert non_dominated_sort(F).tolist() == [0, 0, 1, 0, 2, 0]
+    assert non_dominated(F).tolist() == [True, True, False, True, False, True]
+
+def test_non_dominated_sort_matches_definition():
+    rng = np.random.RandomState(0)
+    for k in (1, 2, 3):
+        F = rng.randint(0, 5, (40, k)).astype(np.float64)  # many ties
+        assert np.array_equal(non_dominated_sort(F), brute_force_sort(F))
+
+def test_crowding_distance():
+    F = np.array([[0, 3], [1, 2], [2, 1], [3, 0]])
+    assert np.allclose(crowding_distance(F), [np.inf, 4/3, 4/3, np.inf])
+
+def test_crowding_distance_within_fronts():
+    F = np.array([[0, 3], [5, 9], [1, 2], [7, 6], [3, 0], [6, 8]])
+    rank = np.array([0, 1, 0, 1, 0, 1])
+    distance = crowding_distance(F, rank)
+    for r in (0, 1):
+        assert np.allclose(distance[rank == r], crowding_distance(F[rank == r]))
+    assert crowding_distance(np.zeros((0, 2))).size == 0
+
+def test_archive_keeps_non_dominated_members():
+    archive = Pareto_archive()
+    assert len(archive) == 0
+    archive.add([[0.0], [1.0], [2.0]], [[1, 4], [2, 3], [3, 3]])
+    archive.add([[3.0], [4.0], [5.0], [1.0]], [[4, 1], [np.inf, 0], [np.nan, 0], [2, 3]])
+    order = np.argsort(archive.P[:, 0])
+    assert archive.P[order, 0].tolist() == [0.0, 1.0, 3.0]  # no failures, no duplicates
+    assert archive.F[order].tolist() == [[1, 4], [2, 3], [4, 1]]
+    archive.add([[6.0]], [[0, 0]])
+    assert archive.P.tolist() == [[6.0]] and archive.F.tolist() == [[0, 0]]
+
+def test_archive_drops_most_crowded_members():
+    archive = Pareto_archive(size=3)
+    f = np.array([0.0, 0.1, 0.2, 0.5, 1.0])
+    archive.add(f[:, None], np.column_stack((f, 1 - f)))
+    assert len(archive) == 3
+    assert {0.0, 1.0} <= set(archive.P[:, 0])  # boundary members stay
+    frame = archive.to_frame(["a"], ["f", "g"])
+    assert list(frame.columns) == ["a", "f", "g"] and len(frame) == 3
+
+def test_multi_objective_refuses_scalar_loss_features():
+    model = lofi.APIs.py_function(lambda x, p: [p[0], 1 - p[0]], p_start=[0.5],
+                                  p_lb=[0], p_ub=[1])
+    opt = lofi.optimizers.NSGA2(model, n=10)
+    for configure in (lambda: opt.set_surrogate(object()),
+                      lambda: opt.set_racing(),
+                      lambda: opt.set_multi_fidelity()):
+        with pytest.raises(ValueError, match="objectives"):
+            configure()
+    model.set_cache()
+    with pytest.raises(ValueError, match="cache"):
+        opt.evaluate_samples()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from lofi.cluster import cluster
+
+MPIRUN = shutil.which("mpirun")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def recording(calls):
+    @cluster.vectorized
+    def work(block, x):
+        calls.append((len(block), x[0]))
+        return block.sum(axis=1)*x[0]
+    return work
+
+def test_blocks_gather_rows_of_the_same_input():
+    calls = []
+    x0, x1 = [1.0], [2.0]
+    rows = np.arange(12.0).reshape(6, 2)
+    chunk = [((row, x), {}) for row in rows for x in (x0, x1)]  # interleaved
+    results = cluster.evaluate(recording(calls), chunk)
+    assert sorted(calls) == [(6, 1.0), (6, 2.0)]
+    expected = [row.sum()*x[0] for row in rows for x in (x0, x1)]
+    assert [result for result, elapsed in results] == expected
+
+def test_product_queue_dispatches_inputs_together():
+    rows = np.random.random((40, 3))
+    queue = cluster.Product_queue((rows, np.random.random((3, 2))))
+    queue.vectorized = True
+    items = list(queue.next_items())
+    inputs = [args[1] for args, kwargs, index in items]
+    for k in range(3):
+        block = inputs[40*k:40*(k + 1)]
+        assert all(x is block[0] for x in block)
+
+def test_product_map_evaluates_blocks():
+    calls = []
+    rows = np.random.random((40, 3))
+    X = [[1.0], [2.0], [3.0]]
+    results, elapsed = cluster.product_map(recording(calls), rows, X,
+                                           reduce=np.add, axis=1)
+    assert np.allclose(results, 6.0*rows.sum(axis=1))
+    assert sum(size for size, x in calls) == 120
+    assert len(calls) < 20  # not one call per row
+
+SCRIPT = """
+import numpy as np
+import lofi
+from lofi.cluster import cluster
+
+calls = []
+
+def f(x, block):
+    calls.append(len(block))
+    return np.sum((block - (0.0 if x is None else x))**2, axis=1)
+
+model = lofi.APIs.py_function(f, p_start=[0.5]*3, p_lb=[-1]*3, p_ub=[1]*3,
+                              vectorized=True)
+opt = lofi.optimizers.PSO(model, n=40)
+X = np.array([[0.1, 0.2, 0.3], [0.0, 0.1, 0.0], [0.3, 0.3, 0.3]])
+calls.clear()
+opt.step(x=X)
+count = cluster.comm.reduce(len(calls), root=0)
+if cluster.global_rank == 0:
+    exact = np.allclose(opt.y, [np.sum((p - X)**2) for p in opt.p])
+    print("RESULT", count, exact, flush=True)
+"""
+
+@pytest.mark.skipif(MPIRUN is None, reason="mpirun is not available")
+def test_vectorized_product_map_over_workers(tmp_path):
+    pytest.importorskip("mpi4py")
+    script = tmp_path / "blocks.py"
+    script.write_text(SCRIPT)
+    path = os.pathsep.join(filter(None, (ROOT, os.environ.get("PYTHONPATH"))))
+    env = dict(os.environ, PYTHONPATH=path,
+               OMPI_ALLOW_RUN_AS_ROOT="1", OMPI_ALLOW_RUN_AS_ROOT_CONFIRM="1",
+               OMPI_MCA_rmaps_base_oversubscribe="1")
+    process = subprocess.run([MPIRUN, "-n", "3", sys.executable, str(script)],
+                             capture_output=True, text=True, env=env, timeout=120)
+    lines = [line for line in process.stdout.splitlines() if line.startswith("RESULT")]
+    assert lines, process.stdout + process.stderr
+    count, exact = lines[0].split()[1:]
+    assert exact == "True"
+    assert int(count) < 41  # 123 rows (40 particles and gbest, 3 inputs)